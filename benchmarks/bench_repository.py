@@ -0,0 +1,104 @@
+"""
+Compare the memory use and construction cost of the slotted repository model against the previous dataclass.
+
+Run with `python benchmarks/bench_repository.py`.
+"""
+import gc
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+import yaml
+
+from cascabel.configuration.configuration_manager import YamlLoader
+from cascabel.repository import Repository
+from cascabel.repository_types import RepositoryTypes
+
+REPOSITORY_COUNTS = [1_000, 10_000, 50_000]
+
+
+@dataclass(frozen=True)
+class DataclassRepository:
+    """The repository model before slots and interning."""
+    url: str
+    type: RepositoryTypes
+    installation_directory: str
+    branch: Optional[str]
+    current_hash: Optional[str]
+    execution_directory: Optional[str]
+    order_place: int = -1
+    lock_hash: bool = False
+    depends_on: tuple[str, ...] = ()
+    tags: tuple[str, ...] = ()
+
+    @staticmethod
+    def repository_dictionary_to_repository(repository_url, repository_info: dict):
+        return DataclassRepository(repository_url, **{**repository_info,
+                                                      "type": RepositoryTypes[repository_info["type"]],
+                                                      "depends_on": tuple(repository_info.get("depends_on") or ()),
+                                                      "tags": tuple(repository_info.get("tags") or ())})
+
+
+def make_configuration_text(repository_count: int) -> str:
+    """
+    Make the text of a configuration of the given size.
+    :param repository_count: The number of repositories to configure.
+    :return: The configuration as YAML.
+    """
+    return yaml.dump({f"git@github.com:user/repository-{index}.git": {
+        "type": "STOW",
+        "installation_directory": f"/home/user/repositories/repository-{index}",
+        "order_place": index % 10,
+        "branch": "main",
+        "current_hash": f"{index:040x}",
+        "lock_hash": False,
+        "execution_directory": None,
+        "depends_on": [f"git@github.com:user/repository-{index - 1}.git"] if index else [],
+        "tags": ["work", "dotfiles"]
+    } for index in range(repository_count)}, Dumper=yaml.SafeDumper)
+
+
+def build_dataclass_repositories(configuration: dict) -> list:
+    return [DataclassRepository.repository_dictionary_to_repository(url, info) for url, info in configuration.items()]
+
+
+def build_slotted_repositories(configuration: dict) -> list:
+    return [Repository.from_mapping(url, info) for url, info in configuration.items()]
+
+
+def retained_memory(build, text: str) -> int:
+    """
+    Measure the memory retained by repositories loaded from a configuration, once the configuration is discarded.
+    :param build: The function building the repositories from the configuration.
+    :param text: The configuration as YAML.
+    :return: The retained memory, in bytes.
+    """
+    gc.collect()
+    tracemalloc.start()
+    repositories = build(yaml.load(text, Loader=YamlLoader))
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del repositories
+
+    return retained
+
+
+def main() -> None:
+    print(f"{'repositories':>12} {'model':>9} {'memory':>10} {'build':>10}")
+    for repository_count in REPOSITORY_COUNTS:
+        text = make_configuration_text(repository_count)
+        configuration = yaml.load(text, Loader=YamlLoader)
+        assert [repository.url for repository in build_slotted_repositories(configuration)] == \
+               [repository.url for repository in build_dataclass_repositories(configuration)], "repositories differ"
+
+        number = max(1, 10_000 // repository_count)
+        for model, build in [("dataclass", build_dataclass_repositories), ("slotted", build_slotted_repositories)]:
+            memory = retained_memory(build, text)
+            build_time = min(timeit.repeat(lambda: build(configuration), number=number, repeat=3)) / number
+            print(f"{repository_count:>12} {model:>9} {memory / 2 ** 20:>8.1f}MB {build_time * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure how long the CLI takes to start, and check it against a startup budget.
+
+Run with `python benchmarks/bench_startup.py [budget in milliseconds]`, which exits
+with a failure if the median start up time of any command is over the budget. The
+commands are run against a configuration of many repositories, as neither help
+nor completion should depend on the size of the configuration.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+# The default budget for starting the CLI, in milliseconds.
+DEFAULT_BUDGET = 100.0
+
+COMMANDS = [["--help"], ["install", "--help"], ["push", "--help"], ["update", "--help"], ["list-all", "--help"]]
+
+# Shell completion of a repository URL, as run by the shell on every tab press.
+COMPLETION_ENVIRONMENT = {"_CASCABEL_COMPLETE": "bash_complete", "COMP_WORDS": "cascabel install --url ",
+                          "COMP_CWORD": "3"}
+RUNS = 15
+REPOSITORY_COUNT = 10_000
+
+
+def time_command(arguments: list[str], home_directory: str, environment: Optional[dict] = None) -> float:
+    """
+    Time starting the CLI with the given arguments.
+    :param arguments: The arguments to the CLI.
+    :param home_directory: The home directory to run the CLI within.
+    :param environment: Any additional environment variables.
+    :return: The median time taken, in milliseconds.
+    """
+    code = f"import sys; sys.argv = ['cascabel', *{arguments!r}]; from cascabel.cli import main; main()"
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       env={**os.environ, **(environment or {}), "HOME": home_directory}, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(times)
+
+
+def write_configuration(home_directory: str) -> None:
+    """
+    Write a configuration of many repositories within the home directory.
+    :param home_directory: The home directory.
+    :return: None.
+    """
+    from cascabel.configuration.configuration_manager import ConfigurationManager
+    from cascabel.repository import Repository
+    from cascabel.repository_types import RepositoryTypes
+
+    manager = ConfigurationManager(Path(home_directory).joinpath(".config").joinpath("cascabel"))
+    for index in range(REPOSITORY_COUNT):
+        manager.write_repository(Repository(url=f"git@github.com:user/repository-{index}.git",
+                                            type=RepositoryTypes.STOW,
+                                            installation_directory=f"/home/user/repository-{index}", branch=None,
+                                            current_hash=None, execution_directory=None))
+    manager.write_configuration()
+
+
+def main() -> None:
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET
+
+    with tempfile.TemporaryDirectory() as home_directory:
+        write_configuration(home_directory)
+
+        interpreter_times = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+            interpreter_times.append((time.perf_counter() - start) * 1000)
+        print(f"{'python -c pass':>24} {statistics.median(interpreter_times):>8.1f}ms")
+
+        over_budget = False
+        for arguments in COMMANDS:
+            median = time_command(arguments, home_directory)
+            over_budget |= median > budget
+            print(f"{'cascabel ' + ' '.join(arguments):>24} {median:>8.1f}ms"
+                  f"{'  (over budget)' if median > budget else ''}")
+
+        median = time_command([], home_directory, COMPLETION_ENVIRONMENT)
+        over_budget |= median > budget
+        print(f"{'complete install --url':>24} {median:>8.1f}ms{'  (over budget)' if median > budget else ''}")
+
+    print(f"Budget: {budget:.0f}ms")
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
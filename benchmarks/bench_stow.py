@@ -0,0 +1,131 @@
+"""
+Compare stowing a synthetic tree of packages with the native stow engine and with GNU stow.
+
+Every package shares the same top-level directories, so that stowing them
+needs directories to be unfolded, as with most dotfiles. The packages are
+stowed again with their directories already existing in the target, so that
+every file needs its own link. GNU stow is skipped if it is not installed.
+
+Run with `python benchmarks/bench_stow.py [FILE_COUNT]`.
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from cascabel.installation.stow_engine import StowEngine
+
+DEFAULT_FILE_COUNT = 100_000
+PACKAGE_COUNT = 100
+DIRECTORIES_PER_PACKAGE = 10
+
+
+def make_packages(stow_directory: Path, file_count: int) -> list[str]:
+    """
+    Make packages holding the given number of files between them.
+    :param stow_directory: The directory to make the packages within.
+    :param file_count: The total number of files.
+    :return: The names of the packages.
+    """
+    files_per_directory = max(1, file_count // (PACKAGE_COUNT * DIRECTORIES_PER_PACKAGE))
+    package_names = []
+    for package_index in range(PACKAGE_COUNT):
+        package_name = f"package-{package_index}"
+        package_names.append(package_name)
+        for directory_index in range(DIRECTORIES_PER_PACKAGE):
+            # Share the top-level directories between packages, along with a directory within them.
+            directory_path = stow_directory.joinpath(package_name, ".config", f"shared-{directory_index}",
+                                                     package_name)
+            directory_path.mkdir(parents=True)
+            for file_index in range(files_per_directory):
+                directory_path.joinpath(f"file-{file_index}").touch()
+
+    return package_names
+
+
+def time_once(function: Callable[[], None]) -> float:
+    """
+    Time a single call of a function.
+    :param function: The function to time.
+    :return: The time taken, in seconds.
+    """
+    start_time = time.perf_counter()
+    function()
+    return time.perf_counter() - start_time
+
+
+def stow_natively(stow_directory: Path, package_names: list[str], restow: bool) -> None:
+    engine = StowEngine(stow_directory)
+    conflicts = engine.stow(package_names, restow=restow)
+    assert not conflicts, conflicts
+    engine.apply()
+
+
+def stow_with_gnu_stow(stow_directory: Path, package_names: list[str], restow: bool) -> None:
+    arguments = ["stow", "--restow"] if restow else ["stow"]
+    subprocess.run(arguments + package_names, cwd=stow_directory, check=True)
+
+
+def make_target_directories(stow_directory: Path, target_directory: Path) -> None:
+    """
+    Make every directory of the packages within the target directory, so that none of them can be folded.
+    :param stow_directory: The stow directory.
+    :param target_directory: The target directory.
+    :return: None.
+    """
+    for package_path in stow_directory.iterdir():
+        for directory_path in package_path.rglob("*"):
+            if directory_path.is_dir():
+                target_directory.joinpath(directory_path.relative_to(package_path)).mkdir(parents=True, exist_ok=True)
+
+
+def list_links(target_directory: Path, stow_directory: Path) -> list[tuple[str, str]]:
+    """
+    List the links within a target directory, leaving out the stow directory.
+    :param target_directory: The target directory.
+    :param stow_directory: The stow directory.
+    :return: Each link, relative to the target directory, along with its destination.
+    """
+    return sorted((str(path.relative_to(target_directory)), str(path.readlink())) for path in
+                  target_directory.rglob("*") if path.is_symlink() and stow_directory not in path.parents)
+
+
+def main() -> None:
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FILE_COUNT
+    backends = [("native", stow_natively)]
+    if shutil.which("stow"):
+        backends.append(("gnu", stow_with_gnu_stow))
+    else:
+        print("GNU stow is not installed: only timing the native engine")
+
+    with tempfile.TemporaryDirectory() as template_directory:
+        template_stow_directory = Path(template_directory, "target", "packages")
+        package_names = make_packages(template_stow_directory, file_count)
+        print(f"{file_count} files in {len(package_names)} packages")
+        print(f"{'scenario':>12} {'backend':>8} {'stow':>9} {'restow':>9} {'links':>7}")
+
+        for scenario in ["folded", "unfolded"]:
+            all_links = {}
+            for name, stow in backends:
+                with tempfile.TemporaryDirectory() as directory:
+                    target_directory = Path(directory, "target")
+                    stow_directory = target_directory.joinpath("packages")
+                    shutil.copytree(template_stow_directory, stow_directory)
+                    if scenario == "unfolded":
+                        make_target_directories(stow_directory, target_directory)
+
+                    stow_time = time_once(lambda: stow(stow_directory, package_names, False))
+                    restow_time = time_once(lambda: stow(stow_directory, package_names, True))
+                    all_links[name] = list_links(target_directory, stow_directory)
+                    print(f"{scenario:>12} {name:>8} {stow_time:>8.2f}s {restow_time:>8.2f}s "
+                          f"{len(all_links[name]):>7}")
+
+            if len(all_links) > 1:
+                assert all_links["native"] == all_links["gnu"], "the native engine and GNU stow made different links"
+
+
+if __name__ == "__main__":
+    main()
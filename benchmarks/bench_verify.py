@@ -0,0 +1,52 @@
+"""
+Compare verifying the links of a synthetic stowed repository with and without the link index.
+
+The packages are stowed with every directory already existing in the
+target, so that every file has its own link to check. A single link is then
+removed, which a verification using the index finds by checking only the
+links within its directory.
+
+Run with `python benchmarks/bench_verify.py [FILE_COUNT]`.
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+from bench_stow import DEFAULT_FILE_COUNT, make_packages, make_target_directories, stow_natively, time_once
+
+from cascabel.configuration.link_index import LinkIndex
+from cascabel.installation.link_verifier import LinkVerifier
+from cascabel.repository import Repository
+from cascabel.repository_types import RepositoryTypes
+
+
+def main() -> None:
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FILE_COUNT
+
+    with tempfile.TemporaryDirectory() as directory:
+        target_directory = Path(directory, "target")
+        stow_directory = target_directory.joinpath("packages")
+        package_names = make_packages(stow_directory, file_count)
+        make_target_directories(stow_directory, target_directory)
+        stow_natively(stow_directory, package_names, False)
+
+        repository = Repository(url="https://example.com/packages.git", type=RepositoryTypes.STOW,
+                                installation_directory=str(stow_directory), branch=None, current_hash=None,
+                                execution_directory=None)
+        index = LinkIndex(Path(directory))
+        print(f"{file_count} files in {len(package_names)} packages")
+
+        full_time = time_once(lambda: LinkVerifier(index, full=True).verify([repository]))
+        print(f"{'full':>12} {full_time:>8.3f}s")
+        unchanged_time = time_once(lambda: LinkVerifier(index).verify([repository]))
+        print(f"{'unchanged':>12} {unchanged_time:>8.3f}s")
+
+        next(path for path in target_directory.rglob("file-0") if path.is_symlink()).unlink()
+        problems = {}
+        drifted_time = time_once(lambda: problems.update(LinkVerifier(index).verify([repository])))
+        assert len(problems[repository.url]) == 1, problems
+        print(f"{'one drifted':>12} {drifted_time:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
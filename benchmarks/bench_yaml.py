@@ -0,0 +1,67 @@
+"""
+Compare loading and dumping the configuration with the pure-Python and libyaml implementations.
+
+Run with `python benchmarks/bench_yaml.py`.
+"""
+import timeit
+
+import yaml
+
+from cascabel.configuration.configuration_manager import YamlDumper, YamlLoader
+
+REPOSITORY_COUNTS = [10, 1_000, 10_000]
+
+
+def make_configuration(repository_count: int) -> dict:
+    """
+    Make a configuration of the given size.
+    :param repository_count: The number of repositories to configure.
+    :return: The configuration as a dictionary.
+    """
+    return {f"git@github.com:user/repository-{index}.git": {
+        "type": "STOW",
+        "installation_directory": f"/home/user/repositories/repository-{index}",
+        "order_place": index % 10,
+        "branch": None,
+        "current_hash": f"{index:040x}",
+        "lock_hash": False,
+        "execution_directory": None,
+        "depends_on": [f"git@github.com:user/repository-{index - 1}.git"] if index else []
+    } for index in range(repository_count)}
+
+
+def best_time(function, number: int) -> float:
+    """
+    Time a function, taking the best of several runs.
+    :param function: The function to time.
+    :param number: The number of calls within each run.
+    :return: The best time of a single call, in seconds.
+    """
+    return min(timeit.repeat(function, number=number, repeat=3)) / number
+
+
+def main() -> None:
+    if YamlLoader is yaml.SafeLoader:
+        print("PyYAML was built without libyaml: only the pure-Python implementation is available")
+        return
+
+    print(f"{'repositories':>12} {'operation':>9} {'python':>10} {'libyaml':>10} {'speedup':>8}")
+    for repository_count in REPOSITORY_COUNTS:
+        configuration = make_configuration(repository_count)
+        text = yaml.dump(configuration, Dumper=yaml.SafeDumper)
+        assert yaml.dump(configuration, Dumper=YamlDumper) == text, "dumped output differs"
+        assert yaml.load(text, Loader=YamlLoader) == configuration, "loaded contents differ"
+
+        number = max(1, 1_000 // repository_count)
+        for operation, python_function, libyaml_function in [
+            ("load", lambda: yaml.load(text, Loader=yaml.SafeLoader), lambda: yaml.load(text, Loader=YamlLoader)),
+            ("dump", lambda: yaml.dump(configuration, Dumper=yaml.SafeDumper),
+             lambda: yaml.dump(configuration, Dumper=YamlDumper))]:
+            python_time = best_time(python_function, number)
+            libyaml_time = best_time(libyaml_function, number)
+            print(f"{repository_count:>12} {operation:>9} {python_time * 1000:>8.2f}ms {libyaml_time * 1000:>8.2f}ms "
+                  f"{python_time / libyaml_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,133 @@
-import shutil
+import functools
 import sys
-from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 import click
-from loguru import logger
 
 from cascabel import __repository__
-from cascabel.configuration.configuration_manager import global_manager, original_configuration_contents
-from cascabel.installation import initialize_installer
-from cascabel.installation.installer import InstallerError, Installer
-from cascabel.repository import Repository
+from cascabel.configuration import CONFIG_BACKEND_VARIABLE, CONFIG_BACKENDS
 from cascabel.repository_types import RepositoryTypes, RepositoryTypeError
 
-LOG_PATH = global_manager.directory_path.joinpath("logging.log")
+# Anything slow to import (logging, YAML, git and the installers) is only imported by the commands which need it, so
+# that starting the CLI (such as for help or shell completion) stays fast.
+if TYPE_CHECKING:
+    from cascabel.configuration.configuration_manager import ConfigurationManager
 
-# Output logs.
-logger.add(LOG_PATH)
+LOG_FILE_NAME = "logging.log"
 
+# The most repository URLs completed at once, as the shell formats each one, and a longer list is never read anyway.
+COMPLETION_LIMIT = 500
+
+
+@functools.lru_cache(maxsize=None)
+def load_configuration() -> "ConfigurationManager":
+    """
+    Load the configuration, and start logging to the configuration directory.
+    :return: The global configuration manager.
+    """
+    from loguru import logger
+
+    from cascabel.configuration.configuration_manager import get_global_manager
+
+    # Use the backend chosen for this invocation, if any.
+    context = click.get_current_context(silent=True)
+    global_manager = get_global_manager(context.find_root().params.get("backend") if context else None)
+
+    # Output logs.
+    logger.add(global_manager.directory_path.joinpath(LOG_FILE_NAME))
+
+    return global_manager
+
+
+def complete_repository_url(ctx: click.Context, param: click.Parameter, incomplete: str) -> list[str]:
+    """
+    Complete a configured repository URL from the completion index.
+    :param ctx: The click context.
+    :param param: The parameter being completed.
+    :param incomplete: The incomplete value.
+    :return: The matching repository URLs, up to the completion limit.
+    """
+    from cascabel.configuration import DEFAULT_CONFIG_PATH
+    from cascabel.configuration.completion_index import CompletionIndex
+
+    # Filter before click builds a completion item for each URL, which takes longer than reading the index.
+    matching_urls = []
+    for url in CompletionIndex(DEFAULT_CONFIG_PATH).read():
+        if url.startswith(incomplete):
+            matching_urls.append(url)
+            if len(matching_urls) == COMPLETION_LIMIT:
+                break
+
+    return matching_urls
+
+
+def check_executables(*names: str) -> None:
+    """
+    Warn about any missing executables needed for operating cascabel.
+    :param names: The names of the executables needed.
+    :return: None.
+    """
+    import shutil
 
-@click.group()
-def main() -> None:
-    """The main execution function."""
     try:
-        # Try and find the necessary packages for operating cascabel.
-        executables = {"git": shutil.which("git"), "stow": shutil.which("stow")}
-        missing_executables = []
-        for key in executables:
-            if not executables[key]:
-                missing_executables.append(key)
+        # Try and find the necessary packages.
+        missing_executables = [name for name in names if not shutil.which(name)]
         if missing_executables:
+            from loguru import logger
+
             logger.warning(f"Missing executables {missing_executables}: please read the README at {__repository__}")
     except Exception as err:
         print(str(err))
         sys.exit(2)
 
 
+@click.group()
+@click.option("--backend", type=click.Choice(CONFIG_BACKENDS), envvar=CONFIG_BACKEND_VARIABLE, default="yaml",
+              show_default=True, help="Choose where the configuration is kept.")
+def main(backend: str) -> None:
+    """The main execution function."""
+    pass
+
+
 @main.command()
-@click.option("--url", "-u", type=click.Choice([r for r in original_configuration_contents]),
+@click.option("--url", "-u", type=str, metavar="URL", shell_complete=complete_repository_url,
               help="Install an individual repository.")
-@click.option("--exclude", "-e", type=click.Choice([r for r in original_configuration_contents]), multiple=True,
+@click.option("--exclude", "-e", type=str, metavar="URL", multiple=True, shell_complete=complete_repository_url,
               help="Exclude a given repository.")
 @click.option("--exclude-type", "-t", type=click.Choice([t.name for t in RepositoryTypes]), multiple=True,
               help="Exclude all repositories of a specified type.")
 @click.option("--ignore-warnings", "-i", type=bool, default=False, help="Ignore any warning messages.")
-def install(url: Optional[str], exclude: tuple[str], exclude_type: Optional[str],
-            ignore_warnings: bool = False) -> None:
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=1,
+              help="Install up to this many repositories at once.")
+@click.option("--tag", type=str, multiple=True, help="Only install repositories with a given tag.")
+@click.option("--locked", is_flag=True, default=False,
+              help="Install the hashes of the lock file without querying any remote.")
+@click.option("--force", "-f", is_flag=True, default=False,
+              help="Install repositories even if they are unchanged since they were last installed.")
+@click.option("--stow-backend", type=click.Choice(["gnu", "native"]), envvar="CASCABEL_STOW_BACKEND", default="gnu",
+              show_default=True, help="Stow packages with GNU stow, or natively without it.")
+@click.option("--fast-status", is_flag=True, default=False,
+              help="Configure new clones with the untracked cache, file system monitor and many files settings.")
+@click.option("--maintenance", "run_maintenance", is_flag=True, default=False,
+              help="Run the git maintenance tasks of installed repositories not maintained within a day.")
+def install(url: Optional[str], exclude: tuple[str], exclude_type: tuple[str], tag: tuple[str],
+            ignore_warnings: bool = False, jobs: int = 1, locked: bool = False, force: bool = False,
+            stow_backend: str = "gnu", fast_status: bool = False, run_maintenance: bool = False) -> None:
     """Clone or pull repositories and then install them."""
+    from dataclasses import replace
+
+    from loguru import logger
+
+    from cascabel.configuration.install_ledger import InstallLedger
+    from cascabel.configuration.lock_file import LockFile
+    from cascabel.installation.scheduler import DependencyError, install_repositories
+    from cascabel.repository import RepositoryRegistry
+
+    # GNU stow is only needed when it is used to stow packages.
+    check_executables(*(["git", "stow"] if stow_backend == "gnu" else ["git"]))
+    global_manager = load_configuration()
+    registry = RepositoryRegistry.from_configuration(global_manager.original_configuration_contents)
+
     if not url:
         # A repository has not been specified, so apply all configured repositories.
         logger.info(f"Installing all repositories listed in configuration {global_manager.configuration_file_path}")
@@ -54,61 +135,33 @@ def install(url: Optional[str], exclude: tuple[str], exclude_type: Optional[str]
         # Get a list of all the (confirmed) repositories to ignore.
         parsed_exclude = set()
         for repository_string in exclude:
-            if repository_string in original_configuration_contents:
+            if repository_string in registry:
                 logger.info(f"Excluding repository '{repository_string}'")
                 parsed_exclude.add(repository_string)
             else:
                 logger.warning(f"Repository '{repository_string}' not in configuration: skipping")
 
-        # Create a list of only the actionable repositories.
-        if exclude_type:
-            # If any types are to be excluded, compile a list and exclude them.
-            parsed_exclude_types = set()
-            for type in exclude_type:
-                # Get the type from the given key.
-                if type in [type.name for type in RepositoryTypes]:
-                    upper_type = type.upper()
-                    logger.info(f"Excluding all repositories of type '{upper_type}'")
-                    parsed_exclude_types.add(upper_type)
-                else:
-                    raise RepositoryTypeError(f"Repository type '{type}' not found")
-
-            # Ignore any repositories of the given exclusion type.
-            key_and_order_list = [{"url": url, "order-place": original_configuration_contents[url]["order_place"]} for
-                                  url
-                                  in
-                                  original_configuration_contents if
-                                  url not in parsed_exclude and original_configuration_contents[url][
-                                      "type"] not in parsed_exclude_types]
-        else:
-            key_and_order_list = [{"url": url, "order-place": original_configuration_contents[url]["order_place"]} for
-                                  url
-                                  in
-                                  original_configuration_contents if url not in parsed_exclude]
+        # Get the types to exclude from the given keys.
+        parsed_exclude_types = set()
+        for type in exclude_type:
+            try:
+                parsed_exclude_types.add(RepositoryTypes[type.upper()])
+            except KeyError:
+                raise RepositoryTypeError(f"Repository type '{type}' not found")
+            logger.info(f"Excluding all repositories of type '{type.upper()}'")
+
+        for repository_tag in tag:
+            if repository_tag not in registry.by_tag:
+                logger.warning(f"No repositories tagged '{repository_tag}'")
 
-        # Sort the repositories by their order place.
-        key_and_order_list.sort(key=lambda x: x["order-place"])
-        actionable_repository_urls = [x["url"] for x in key_and_order_list]
+        # Select only the actionable repositories, sorted by their order place, which decides which of the
+        # repositories ready at the same time are started first.
+        repositories = registry.select(exclude_urls=parsed_exclude, exclude_types=parsed_exclude_types, tags=tag)
 
-        if not actionable_repository_urls:
+        if not repositories:
             logger.info("No actionable repositories: returning")
             return
 
-        for repository_url in actionable_repository_urls:
-            # Create a repository dataclass from the dictionary.
-            repository = Repository.repository_dictionary_to_repository(repository_url,
-                                                                        original_configuration_contents[
-                                                                            repository_url])
-
-            try:
-                installer = initialize_installer(repository, global_manager, not ignore_warnings)
-                installer.install()
-            except InstallerError as err:
-                logger.error(f"{err}: skipping repository '{repository.url}'")
-                continue
-
-            pass
-
     else:
         # Otherwise, apply the specified repository.
 
@@ -120,12 +173,112 @@ def install(url: Optional[str], exclude: tuple[str], exclude_type: Optional[str]
             # If a type to exclude is provided, then ignore it.
             logger.warning("URL has been specified: ignoring type exclusion")
 
+        if tag:
+            # If tags are provided, then ignore them.
+            logger.warning("URL has been specified: ignoring tags")
+
         # Try and find it first.
-        repository_string = original_configuration_contents[url]
-        if not repository_string:
+        repository = registry.get(url)
+        if not repository:
             logger.error(f"Could not find repository '{url}': exiting")
+            sys.exit(1)
 
         logger.info(f"Applying repository '{url}'")
+        repositories = [repository]
+
+    if locked:
+        # Apply the hashes of the lock file, so that no repository needs to query its remote.
+        lock_file = LockFile(global_manager.directory_path)
+        if not lock_file.exists():
+            logger.error(f"No lock file at '{lock_file.lock_file_path}': run the update command first")
+            sys.exit(1)
+
+        locked_hashes = lock_file.read_hashes()
+        missing_urls = [r.url for r in repositories if r.url not in locked_hashes]
+        if missing_urls:
+            logger.error(f"Repositories {missing_urls} are not in the lock file: skipping them")
+
+        repositories = [replace(r, lock_hash=True, current_hash=locked_hashes[r.url]) for r in repositories if
+                        r.url in locked_hashes]
+
+    # Skip the installers of any repository unchanged since it was last installed.
+    ledger = InstallLedger(global_manager.directory_path)
+
+    try:
+        # Collect any updated hashes in memory, and write them to the configuration once at the end.
+        with global_manager.deferred_writes():
+            failed_urls = install_repositories(repositories, global_manager, not ignore_warnings, jobs, ledger, force,
+                                               stow_backend, fast_status)
+    except DependencyError as err:
+        logger.error(f"{err}: cancelling installation")
+        sys.exit(1)
+    finally:
+        ledger.write()
+
+    if failed_urls:
+        logger.warning(f"Failed to install {len(failed_urls)} of {len(repositories)} repositories: {failed_urls}")
+
+    if run_maintenance:
+        from cascabel.configuration.maintenance_log import MaintenanceLog
+        from cascabel.installation.maintenance import maintain_repositories
+
+        # Maintain the installed repositories once every install has finished, so that it never delays them.
+        maintenance_log = MaintenanceLog(global_manager.directory_path)
+        try:
+            maintain_repositories([r for r in repositories if r.url not in failed_urls], jobs, maintenance_log,
+                                  configure=fast_status)
+        finally:
+            maintenance_log.write()
+
+
+@main.command()
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=8,
+              help="Resolve up to this many remote repositories at once.")
+def update(jobs: int = 8) -> None:
+    """Resolve the latest commit of every repository and write the lock file."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from loguru import logger
+
+    from cascabel.configuration.lock_file import LockFile
+    from cascabel.installation.installer import Installer, InstallerError
+    from cascabel.repository import Repository, RepositoryRegistry
+
+    check_executables("git")
+    global_manager = load_configuration()
+    registry = RepositoryRegistry.from_configuration(global_manager.original_configuration_contents)
+
+    repositories = list(registry)
+    if not repositories:
+        logger.info("No repositories to resolve: cancelling")
+        return
+
+    def resolve(repository: "Repository") -> Optional[str]:
+        # Repositories with a locked hash keep it, so only the others need to query their remote.
+        if repository.lock_hash and repository.current_hash:
+            return repository.current_hash
+
+        try:
+            return Installer.resolve_remote_commit(repository.url, repository.branch)
+        except InstallerError as e:
+            logger.error(f"{e}: skipping repository '{repository.url}'")
+            return None
+
+    logger.info(f"Resolving {len(repositories)} repositories")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        resolved_hashes = list(executor.map(resolve, repositories))
+
+    lock_file = LockFile(global_manager.directory_path)
+    entries = {}
+    if lock_file.exists():
+        # Keep the previous entry of any repository which could not be resolved.
+        entries = {url: entry for url, entry in lock_file.read().items() if url in registry}
+    for repository, resolved_hash in zip(repositories, resolved_hashes):
+        if resolved_hash:
+            entries[repository.url] = {"branch": repository.branch, "hash": resolved_hash}
+
+    lock_file.write(entries)
+    logger.info(f"Wrote {len(entries)} resolved repositories to '{lock_file.lock_file_path}'")
 
 
 @main.command()
@@ -133,19 +286,34 @@ def install(url: Optional[str], exclude: tuple[str], exclude_type: Optional[str]
 @click.argument("type", type=click.Choice([t.name for t in RepositoryTypes]))
 @click.argument("installation-directory", type=str)
 @click.option("--order-place", "-p", type=int, default=-1,
-              help="Specify the order in which this repository is executed in relation to others.")
+              help="Specify the order in which this repository is started in relation to others.")
 @click.option("--branch", "-b", type=str, help="Specify the branch to use.")
 @click.option("--current-hash", "-h", type=str, help="Specify the Desired hash of git repository to use.")
 @click.option("--lock-hash", "-l", type=bool, default=False,
               help="Lock the specified hash and do not pull from newer versions.")
 @click.option("--execution-directory", "-e", type=str, help="Set the directory to evaluate for configuration files.")
+@click.option("--depends-on", "-d", type=str, multiple=True,
+              help="Specify the URL of a repository which must be installed before this one.")
+@click.option("--tag", type=str, multiple=True, help="Tag the repository, so that it can be selected by the tag.")
+@click.option("--target-directory", type=str,
+              help="Set the directory to stow packages into, instead of the parent of the packages.")
 @click.option("--overwrite/--no-overwrite", "-o", type=bool, default=False, help="Overwrite any existing repository.")
 def add(url: str, type: str, installation_directory: str, branch, current_hash: Optional[str],
         execution_directory: Optional[str],
+        depends_on: tuple[str],
+        tag: tuple[str],
+        target_directory: Optional[str] = None,
         order_place: int = -1,
         lock_hash: bool = False,
         overwrite: bool = False) -> None:
     """Add a new repository configuration."""
+    from loguru import logger
+
+    from cascabel.repository import Repository
+
+    global_manager = load_configuration()
+    original_configuration_contents = global_manager.original_configuration_contents
+
     # Get the type from the given key.
     try:
         parsed_type = RepositoryTypes[type.upper()]
@@ -161,7 +329,8 @@ def add(url: str, type: str, installation_directory: str, branch, current_hash:
                        branch=branch,
                        order_place=order_place,
                        current_hash=current_hash,
-                       lock_hash=lock_hash, execution_directory=execution_directory))
+                       lock_hash=lock_hash, execution_directory=execution_directory,
+                       depends_on=depends_on, tags=tag, target_directory=target_directory))
         global_manager.write_configuration()
 
         if overwrite and url in original_configuration_contents:
@@ -172,40 +341,196 @@ def add(url: str, type: str, installation_directory: str, branch, current_hash:
 
 @main.command()
 @click.option("--message", "-m", type=str, help="Change the commit message used.")
-@click.option("--exclude", "-e", type=click.Choice([r for r in original_configuration_contents]), multiple=True,
+@click.option("--exclude", "-e", type=str, metavar="URL", multiple=True, shell_complete=complete_repository_url,
               help="Exclude a given repository.")
-def push(message: Optional[str], exclude: tuple[str]) -> None:
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=8, help="Push up to this many repositories at once.")
+@click.option("--host-jobs", type=click.IntRange(min=1), default=4, show_default=True,
+              help="Push up to this many repositories to the same host at once.")
+@click.option("--dry-run", is_flag=True, default=False,
+              help="Only summarize what would be committed and pushed, without contacting any remote.")
+def push(message: Optional[str], exclude: tuple[str], jobs: int = 8, host_jobs: int = 4,
+         dry_run: bool = False) -> None:
     """Push all repository changes."""
-    repository_urls = [url for url in original_configuration_contents]
+    from pathlib import Path
 
-    expected_repository_paths = []
-    try:
-        expected_repository_paths = [original_configuration_contents[url]["installation_directory"] for url in
-                                     repository_urls if url not in exclude]
-    except KeyError as e:
-        logger.error(f"Could not push repositories: {e}")
+    from loguru import logger
+
+    from cascabel.installation.pusher import FAILED_RESULTS, get_repository_statuses, push_repositories
+    from cascabel.repository import RepositoryRegistry
+
+    check_executables("git")
+    registry = RepositoryRegistry.from_configuration(load_configuration().original_configuration_contents)
+
+    for repository_string in exclude:
+        if repository_string not in registry:
+            logger.warning(f"Repository '{repository_string}' not in configuration: skipping")
 
-    if not expected_repository_paths:
+    urls_by_path = {Path(repository.installation_directory): repository.url for repository in
+                    registry.select(exclude_urls=exclude)}
+
+    if not urls_by_path:
         logger.info("No repositories to push changes: cancelling")
         return
 
-    for path in expected_repository_paths:
-        try:
-            if message:
-                Installer.push_changes(repository_path=Path(path), message=message)
+    if dry_run:
+        # Compare each repository with its remote-tracking ref, as of the last fetch.
+        for path, status in get_repository_statuses(urls_by_path, jobs).items():
+            if status is None:
+                continue
+            if status["upstream"] is None:
+                position = "has no upstream"
             else:
-                Installer.push_changes(repository_path=Path(path))
+                position = f"is {status['ahead']} ahead and {status['behind']} behind '{status['upstream']}'"
+            action = "would push" if status["paths"] or status["ahead"] else "nothing to push"
+            logger.info(f"Repository '{urls_by_path[path]}' has {len(status['paths'])} changed paths and {position}: "
+                        f"{action}")
+        return
 
-        except InstallerError as e:
-            logger.error(f"{e}: cancelling any future push")
+    results = push_repositories(urls_by_path, message, jobs, host_jobs)
+
+    # Summarize the result of every repository, as the errors are logged as they happen in any order.
+    for path, result in results.items():
+        (logger.error if result in FAILED_RESULTS else logger.info)(f"Repository '{urls_by_path[path]}': {result}")
+
+    failed_count = sum(result in FAILED_RESULTS for result in results.values())
+    if failed_count:
+        logger.error(f"Failed to push {failed_count} of {len(results)} repositories")
+        sys.exit(1)
 
     logger.info("All repository changes have been pushed")
 
 
+@main.command()
+@click.option("--exclude", "-e", type=str, metavar="URL", multiple=True, shell_complete=complete_repository_url,
+              help="Exclude a given repository.")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=8,
+              help="Maintain up to this many repositories at once.")
+@click.option("--interval", type=click.FloatRange(min=0), default=24.0, show_default=True, metavar="HOURS",
+              help="Only run the maintenance tasks of repositories not maintained within this many hours.")
+@click.option("--force", "-f", is_flag=True, default=False,
+              help="Run the maintenance tasks of every repository, however recently they ran.")
+def maintenance(exclude: tuple[str], jobs: int = 8, interval: float = 24.0, force: bool = False) -> None:
+    """Configure every cloned repository to keep status fast, and run its git maintenance tasks."""
+    from loguru import logger
+
+    from cascabel.configuration.maintenance_log import MaintenanceLog
+    from cascabel.installation.maintenance import maintain_repositories
+    from cascabel.repository import RepositoryRegistry
+
+    check_executables("git")
+    global_manager = load_configuration()
+    registry = RepositoryRegistry.from_configuration(global_manager.original_configuration_contents)
+
+    for repository_string in exclude:
+        if repository_string not in registry:
+            logger.warning(f"Repository '{repository_string}' not in configuration: skipping")
+
+    repositories = registry.select(exclude_urls=exclude)
+    if not repositories:
+        logger.info("No repositories to maintain: cancelling")
+        return
+
+    # Skip the maintenance tasks of any repository maintained within the interval.
+    maintenance_log = MaintenanceLog(global_manager.directory_path)
+    try:
+        failed_urls = maintain_repositories(repositories, jobs, maintenance_log, interval * 60 * 60, force)
+    finally:
+        maintenance_log.write()
+
+    if failed_urls:
+        logger.warning(f"Failed to maintain {len(failed_urls)} of {len(repositories)} repositories: {failed_urls}")
+        return
+
+    logger.info(f"Maintained {len(repositories)} repositories")
+
+
+@main.command()
+@click.option("--url", "-u", type=str, metavar="URL", shell_complete=complete_repository_url,
+              help="Verify an individual repository.")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=8, help="Check up to this many packages at once.")
+@click.option("--full", is_flag=True, default=False,
+              help="Check every link, rather than only those within directories changed since the last check.")
+def verify(url: Optional[str], jobs: int = 8, full: bool = False) -> None:
+    """Check that the links of every stowed repository still point into it."""
+    from loguru import logger
+
+    from cascabel.configuration.install_ledger import InstallLedger
+    from cascabel.configuration.link_index import LinkIndex
+    from cascabel.installation.link_verifier import LinkVerifier
+    from cascabel.repository import RepositoryRegistry
+
+    global_manager = load_configuration()
+    registry = RepositoryRegistry.from_configuration(global_manager.original_configuration_contents)
+
+    if url and url not in registry:
+        logger.error(f"Could not find repository '{url}': exiting")
+        sys.exit(1)
+
+    # Only stowed repositories have any links to verify.
+    repositories = [repository for repository in ([registry.by_url[url]] if url else registry.select()) if
+                    repository.type == RepositoryTypes.STOW]
+    if not repositories:
+        logger.info("No stowed repositories to verify: cancelling")
+        return
+
+    verifier = LinkVerifier(LinkIndex(global_manager.directory_path), InstallLedger(global_manager.directory_path),
+                            jobs, full)
+    problems = verifier.verify(repositories)
+    for repository_url, repository_problems in problems.items():
+        for status, target_path, source_path in repository_problems:
+            logger.warning(f"Link '{target_path}' of repository '{repository_url}' is {status}: expected it to point "
+                           f"to '{source_path}'")
+
+    if problems:
+        logger.error(f"Found {sum(map(len, problems.values()))} drifted links in {len(problems)} of "
+                     f"{len(repositories)} repositories: reinstall them with 'cascabel install --force'")
+        sys.exit(1)
+
+    logger.info(f"All links of {len(repositories)} repositories are in place")
+
+
+@main.command("import")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False), required=False)
+def import_configuration(file: Optional[str]) -> None:
+    """Replace the SQLite configuration with a YAML configuration file."""
+    from pathlib import Path
+
+    from loguru import logger
+
+    from cascabel.configuration.configuration_manager import CONFIG_FILE_NAME
+    from cascabel.configuration.sqlite_configuration_manager import SqliteConfigurationManager
+
+    global_manager = load_configuration()
+    if not isinstance(global_manager, SqliteConfigurationManager):
+        logger.error("The configuration is already kept in YAML: use '--backend sqlite' to import it")
+        sys.exit(1)
+
+    global_manager.import_configuration(
+        Path(file) if file else global_manager.directory_path.joinpath(CONFIG_FILE_NAME))
+
+
+@main.command("export")
+@click.argument("file", type=click.Path(dir_okay=False), required=False)
+def export_configuration(file: Optional[str]) -> None:
+    """Write the SQLite configuration to a YAML configuration file."""
+    from pathlib import Path
+
+    from loguru import logger
+
+    from cascabel.configuration.sqlite_configuration_manager import SqliteConfigurationManager
+
+    global_manager = load_configuration()
+    if not isinstance(global_manager, SqliteConfigurationManager):
+        logger.error("The configuration is already kept in YAML: use '--backend sqlite' to export it")
+        sys.exit(1)
+
+    global_manager.export_configuration(Path(file) if file else None)
+
+
 @main.command()
 def list_all() -> None:
     """List all configured repositories."""
-    print(global_manager.get_configuration())
+    print(load_configuration().get_configuration())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,26 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+# The environment variable selecting where the configuration is kept, out of the available backends.
+CONFIG_BACKEND_VARIABLE = "CASCABEL_CONFIG_BACKEND"
+CONFIG_BACKENDS = ["yaml", "sqlite"]
+
+
+def __getattr__(name: str) -> "Path":
+    """
+    Get the directory containing the configuration, along with any files derived from it, as `DEFAULT_CONFIG_PATH`.
+
+    The directory is only made once first used, as importing pathlib for it would slow down showing the help of the
+    CLI, which never needs it.
+    :param name: The name of the attribute.
+    :return: The directory containing the configuration.
+    """
+    if name != "DEFAULT_CONFIG_PATH":
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    from pathlib import Path
+
+    globals()[name] = Path.home().joinpath(".config").joinpath("cascabel")
+    return globals()[name]
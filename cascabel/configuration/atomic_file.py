@@ -0,0 +1,61 @@
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+
+def sync_directory(directory_path: Path) -> None:
+    """
+    Flush the renaming of a file within a directory to disk.
+    :param directory_path: The directory.
+    :return: None.
+    """
+    try:
+        directory_descriptor = os.open(directory_path, os.O_RDONLY)
+    except OSError:
+        # Not every platform allows opening a directory.
+        return
+
+    try:
+        os.fsync(directory_descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(directory_descriptor)
+
+
+def write_atomically(file_path: Path, data: bytes) -> os.stat_result:
+    """
+    Replace the contents of a file atomically, so that it is never seen partially written.
+
+    The data is written and flushed to disk in a temporary file with a unique
+    name beside the file, which then replaces it, so that concurrent writers
+    never share a temporary file, and the last one to finish wins. An existing
+    file keeps its permissions, while a new file is only accessible by its
+    owner.
+    :param file_path: The path of the file.
+    :param data: The new contents of the file.
+    :return: The status of the written file.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(file_path).st_mode)
+    except FileNotFoundError:
+        mode = None
+
+    file_descriptor, temporary_path = tempfile.mkstemp(prefix=f".{file_path.name}.", dir=file_path.parent)
+    try:
+        with os.fdopen(file_descriptor, "wb") as stream:
+            stream.write(data)
+            stream.flush()
+            os.fsync(stream.fileno())
+        if mode is not None:
+            os.chmod(temporary_path, mode)
+        status = os.stat(temporary_path)
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        # The file itself is untouched, so only the temporary file needs to be removed.
+        Path(temporary_path).unlink(missing_ok=True)
+        raise
+
+    sync_directory(file_path.parent)
+    return status
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+COMPLETION_INDEX_FILE_NAME = ".repositories.completion"
+
+
+class CompletionIndex:
+    """
+    A plain list of the configured repository URLs, used for shell completion.
+
+    The index is written whenever the configuration is written or parsed, so
+    that completing a URL never needs to parse the configuration itself.
+    """
+
+    def __init__(self, directory_path: Path) -> None:
+        """
+        Initialize the completion index.
+        :param directory_path: The directory containing the completion index.
+        """
+        self.index_file_path = directory_path.joinpath(COMPLETION_INDEX_FILE_NAME)
+
+    def exists(self) -> bool:
+        """
+        Check whether the completion index has been written.
+        :return: Whether the completion index exists.
+        """
+        return self.index_file_path.exists()
+
+    def read(self) -> list[str]:
+        """
+        Read the repository URLs within the index.
+        :return: The repository URLs, or an empty list if there is no index.
+        """
+        try:
+            return self.index_file_path.read_text().splitlines()
+        except OSError:
+            return []
+
+    def write(self, urls: list[str]) -> None:
+        """
+        Write the repository URLs to the index.
+        :param urls: The repository URLs.
+        :return: None.
+        """
+        # Completion only ever reads the index, so it never pays for importing what writing needs.
+        from cascabel.configuration.atomic_file import write_atomically
+
+        write_atomically(self.index_file_path, "".join(f"{url}\n" for url in urls).encode())
@@ -1,32 +1,95 @@
+import functools
+import hashlib
+import marshal
+import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, Iterable, Iterator, Optional, Union
 
 import yaml
 from loguru import logger
 
+from cascabel.configuration import CONFIG_BACKEND_VARIABLE, CONFIG_BACKENDS, DEFAULT_CONFIG_PATH
+from cascabel.configuration.atomic_file import write_atomically
+from cascabel.configuration.completion_index import CompletionIndex
 from cascabel.repository import Repository
 
+try:
+    import fcntl
+except ImportError:
+    # Advisory file locks are not available on this platform.
+    fcntl = None  # type: ignore
+
+try:
+    # Use the libyaml bindings if PyYAML was built with them, which produce exactly the same output.
+    from yaml import CSafeDumper as YamlDumper, CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeDumper as YamlDumper, SafeLoader as YamlLoader  # type: ignore
+
 CONFIG_FILE_NAME = "repositories.yml"
-DEFAULT_CONFIG_PATH = Path.home().joinpath(".config").joinpath("cascabel")
+CONFIG_LOCK_FILE_NAME = ".repositories.yml.lock"
+CONFIG_CACHE_FILE_NAME = ".repositories.yml.cache"
+
+# The version of the configuration cache format, changed whenever cached contents would no longer be valid.
+CONFIG_CACHE_FORMAT = 1
+
+# The longest time that deferred writes are kept in memory before the configuration is written anyway.
+DEFERRED_WRITE_CHECKPOINT_SECONDS = 30.0
 
 
 class ConfigurationManager:
     """A manager for the main configuration file."""
 
+    # The name of the file the configuration is kept in, within the configuration directory.
+    configuration_file_name = CONFIG_FILE_NAME
+
     def __init__(self, directory_path: Path = DEFAULT_CONFIG_PATH) -> None:
         """
         Initialize the configuration manager.
         :param directory_path: The directory to initialize the configuration.
         """
         self.directory_path = directory_path
-        self.configuration_file_path = directory_path.joinpath(CONFIG_FILE_NAME)
+        self.configuration_file_path = directory_path.joinpath(self.configuration_file_name)
         self.configuration_contents: dict[str, Any] = {}
 
+        # The advisory lock file guarding the configuration file between processes, which also holds a version
+        # counter incremented on every write.
+        self.lock_file_path = directory_path.joinpath(CONFIG_LOCK_FILE_NAME)
+
+        # A compiled copy of the parsed configuration file, which is loaded instead of parsing the YAML for as long as
+        # the configuration file is unchanged.
+        self.cache_file_path = directory_path.joinpath(CONFIG_CACHE_FILE_NAME)
+
+        # The configured repository URLs, kept up to date for shell completion.
+        self.completion_index = CompletionIndex(directory_path)
+
+        # The state of the configuration file when it was last read or written by this manager, used to find whether
+        # another process has written it since.
+        self.file_state: tuple[int, int, int] = (0, 0, 0)
+
+        # The repositories changed or removed by this manager since the last read or write, which are merged into the
+        # configuration file if another process has written it since.
+        self.changed_urls: set[str] = set()
+        self.removed_urls: set[str] = set()
+
+        # Guard the contents and the file, as installers may update them from several threads at once.
+        self.lock = threading.RLock()
+
+        # Writes are held in memory while within any deferred writes block.
+        self.deferred_write_depth = 0
+        self.has_pending_write = False
+        self.last_write_time = time.monotonic()
+
         # Create the expected directory path structure.
         self.directory_path.mkdir(parents=True, exist_ok=True)
 
         # Create the configuration file.
-        self.configuration_file_path.touch(exist_ok=True)
+        #
+        # An existing file is left untouched, as changing its modification time would invalidate the cache.
+        if not self.configuration_file_path.exists():
+            self.configuration_file_path.touch()
 
         # Read the configuration contents.
         #
@@ -34,36 +97,222 @@ class ConfigurationManager:
         # original version.
         self.original_configuration_contents = self.read_configuration()
 
+    @contextmanager
+    def deferred_writes(self) -> Iterator[None]:
+        """
+        Defer writing the configuration until the end of the block.
+
+        Any configuration writes within the block only mark the contents as
+        changed, and the configuration is written once when the outermost block
+        ends (or at a checkpoint, if the block runs for long enough).
+        :return: An iterator for use as a context manager.
+        """
+        with self.lock:
+            self.deferred_write_depth += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.deferred_write_depth -= 1
+                if not self.deferred_write_depth:
+                    self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the configuration if any deferred write is pending.
+        :return: None.
+        """
+        with self.lock:
+            if self.has_pending_write:
+                self.__write_now()
+
     def write_configuration(self) -> None:
         """
         Write a configuration to the configuration file.
+
+        Within a deferred writes block, the write is instead held until the
+        end of the block or the next checkpoint.
+        :return: None.
+        """
+        with self.lock:
+            if self.deferred_write_depth:
+                self.has_pending_write = True
+                if time.monotonic() - self.last_write_time < DEFERRED_WRITE_CHECKPOINT_SECONDS:
+                    return
+
+            self.__write_now()
+
+    def __write_now(self) -> None:
+        """
+        Write the changes to the configuration, clearing any pending deferred write.
+        :return: None.
+        """
+        self.has_pending_write = False
+        self.last_write_time = time.monotonic()
+        self._write_changes()
+
+    @contextmanager
+    def __file_lock(self, exclusive: bool) -> Iterator[int]:
+        """
+        Hold the advisory lock guarding the configuration file between processes.
+        :param exclusive: Hold an exclusive lock for writing, rather than a shared lock for reading.
+        :return: An iterator of the current version counter, for use as a context manager.
+        """
+        with open(self.lock_file_path, "a+") as lock_stream:
+            if fcntl:
+                fcntl.flock(lock_stream.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                lock_stream.seek(0)
+                version = lock_stream.read().strip()
+                yield int(version) if version.isdigit() else 0
+
+                if exclusive:
+                    # Increment the version counter now that the configuration file has been written.
+                    lock_stream.seek(0)
+                    lock_stream.truncate()
+                    lock_stream.write(str(self.file_state[0]))
+                    lock_stream.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_stream.fileno(), fcntl.LOCK_UN)
+
+    def __get_file_state(self, version: int) -> tuple[int, int, int]:
+        """
+        Get the state of the configuration file.
+        :param version: The current version counter.
+        :return: The version counter, modification time and size of the configuration file.
+        """
+        try:
+            stat = self.configuration_file_path.stat()
+        except FileNotFoundError:
+            return version, 0, 0
+
+        return version, stat.st_mtime_ns, stat.st_size
+
+    def __load_configuration_file(self) -> dict:
+        """
+        Load the contents of the configuration file, using the cache if it is still fresh.
+        :return: The configuration as a dictionary.
+        """
+        with open(self.configuration_file_path.absolute(), "rb") as stream:
+            stat = os.fstat(stream.fileno())
+            text = stream.read()
+        cache_key = ConfigurationManager.__get_cache_key(stat, text)
+
+        try:
+            cached_key, cached_contents = marshal.loads(self.cache_file_path.read_bytes())
+            if cached_key == cache_key:
+                if not self.completion_index.exists():
+                    self._write_completion_index(cached_contents)
+                return cached_contents
+        except (OSError, EOFError, ValueError, TypeError):
+            # The cache is either missing or unreadable, so it is simply rebuilt.
+            pass
+
+        # Read the contents.
+        #
+        # If there is nothing to read, then consider the contents to be an empty dictionary.
+        contents = yaml.load(text, Loader=YamlLoader)
+        if contents is None:
+            contents = {}
+
+        self.__write_cache(cache_key, contents)
+        return contents
+
+    def __write_cache(self, cache_key: tuple, contents: dict) -> None:
+        """
+        Write the compiled configuration cache, along with the completion index.
+        :param cache_key: The key of the configuration file the contents were read from.
+        :param contents: The configuration contents.
+        :return: None.
+        """
+        self._write_completion_index(contents)
+
+        try:
+            compiled_contents = marshal.dumps((cache_key, contents))
+        except ValueError:
+            # The contents include values which cannot be compiled, so they are always parsed instead.
+            self.cache_file_path.unlink(missing_ok=True)
+            return
+
+        try:
+            write_atomically(self.cache_file_path, compiled_contents)
+        except OSError as e:
+            logger.debug(f"Could not write configuration cache: {e}")
+
+    def _write_completion_index(self, urls: Iterable[str]) -> None:
+        """
+        Write the configured repository URLs to the completion index, only logging any failure, as the configuration
+        itself does not depend on it.
+        :param urls: The repository URLs.
         :return: None.
         """
-        with open(self.configuration_file_path.absolute(), "w") as stream:
+        try:
+            self.completion_index.write(list(urls))
+        except OSError as e:
+            logger.debug(f"Could not write completion index: {e}")
+
+    @staticmethod
+    def __get_cache_key(stat: os.stat_result, text: bytes) -> tuple:
+        """
+        Get the key identifying the contents of a configuration file.
+        :param stat: The status of the configuration file.
+        :param text: The contents of the configuration file.
+        :return: The cache key.
+        """
+        return CONFIG_CACHE_FORMAT, stat.st_mtime_ns, stat.st_size, hashlib.blake2b(text, digest_size=16).digest()
+
+    def _write_changes(self) -> None:
+        """
+        Write the configuration contents to the configuration file.
+
+        This is the only write a subclass keeping the configuration elsewhere
+        needs to override. The contents are written to a temporary file which
+        atomically replaces the configuration file, so that it is never left
+        partially written. If another process has written the configuration
+        file since it was read, then the repositories changed by this manager
+        are merged into it.
+        :return: None.
+        """
+        with self.lock, self.__file_lock(exclusive=True) as version:
+            if self.__get_file_state(version) != self.file_state:
+                logger.debug("Configuration changed by another process: merging changes")
+                latest_contents = self.__load_configuration_file()
+                for url in self.changed_urls:
+                    latest_contents[url] = self.configuration_contents[url]
+                for url in self.removed_urls:
+                    latest_contents.pop(url, None)
+
+                # Update the contents in place, as they may be shared by whoever read them.
+                self.configuration_contents.clear()
+                self.configuration_contents.update(latest_contents)
+
             try:
-                # If the contents consist of an empty dictionary, then delete the file contents.
-                if not self.configuration_contents:
-                    stream.truncate(0)
-                else:
-                    yaml.safe_dump(self.configuration_contents, stream)
+                # If the contents consist of an empty dictionary, then leave the file empty.
+                text = yaml.dump(self.configuration_contents, Dumper=YamlDumper).encode() if self.configuration_contents \
+                    else b""
+                stat = write_atomically(self.configuration_file_path, text)
             except Exception as e:
                 logger.error(f"Error writing to configuration: {e}")
-                # If an exception occurs, try and write the original contents.
-                yaml.safe_dump(self.original_configuration_contents, stream)
+                self.file_state = self.__get_file_state(version)
+                return
+
+            self.__write_cache(ConfigurationManager.__get_cache_key(stat, text), self.configuration_contents)
+            self.file_state = self.__get_file_state(version + 1)
+            self.changed_urls.clear()
+            self.removed_urls.clear()
 
     def read_configuration(self) -> dict:
         """
         Read the configuration from the configuration file.
         :return: The configuration as a dictionary.
         """
-        with open(self.configuration_file_path.absolute(), "r") as stream:
-            # Read the contents.
-            #
-            # If there is nothing to read, then consider the contents to be an empty dictionary.
-            contents = yaml.safe_load(stream)
-            if contents is None:
-                contents = {}
+        with self.lock, self.__file_lock(exclusive=False) as version:
+            contents = self.__load_configuration_file()
 
+            self.file_state = self.__get_file_state(version)
+            self.changed_urls.clear()
+            self.removed_urls.clear()
             self.configuration_contents = contents
             return contents
 
@@ -73,15 +322,21 @@ class ConfigurationManager:
         :param repository: The repository to write.
         :return:  None.
         """
-        self.configuration_contents[repository.url] = {
-            "type": repository.type.name,
-            "installation_directory": repository.installation_directory,
-            "order_place": repository.order_place or -1,
-            "branch": repository.branch,
-            "current_hash": repository.current_hash or None,
-            "lock_hash": repository.lock_hash or False,
-            "execution_directory": repository.execution_directory or None
-        }
+        with self.lock:
+            self.changed_urls.add(repository.url)
+            self.removed_urls.discard(repository.url)
+            self.configuration_contents[repository.url] = {
+                "type": repository.type.name,
+                "installation_directory": repository.installation_directory,
+                "order_place": repository.order_place or -1,
+                "branch": repository.branch,
+                "current_hash": repository.current_hash or None,
+                "lock_hash": repository.lock_hash or False,
+                "execution_directory": repository.execution_directory or None,
+                "depends_on": list(repository.depends_on),
+                "tags": list(repository.tags),
+                "target_directory": repository.target_directory or None
+            }
 
     def remove_repository_by_object(self, repository: Repository) -> None:
         """
@@ -89,7 +344,7 @@ class ConfigurationManager:
         :param repository: The repository.
         :return: None.
         """
-        self.configuration_contents.pop(repository.url)
+        self.remove_repository_by_url(repository.url)
 
     def remove_repository_by_url(self, url: str) -> None:
         """
@@ -97,7 +352,10 @@ class ConfigurationManager:
         :param url: The repository URL.
         :return: None.
         """
-        self.configuration_contents.pop(url)
+        with self.lock:
+            self.configuration_contents.pop(url)
+            self.changed_urls.discard(url)
+            self.removed_urls.add(url)
 
     def get_configuration(self, as_string: bool = True) -> Union[dict, str]:
         """
@@ -105,14 +363,28 @@ class ConfigurationManager:
         :param as_string: Return the configuration as a string.
         :return: The configuration either as a string, or a dictionary.
         """
-        with open(self.configuration_file_path.absolute(), "r") as stream:
-            yaml_contents = yaml.safe_load(stream)
+        with self.lock, self.__file_lock(exclusive=False):
+            yaml_contents = self.__load_configuration_file()
             if as_string:
-                return yaml.safe_dump(yaml_contents)
+                return yaml.dump(yaml_contents, Dumper=YamlDumper)
 
             return yaml_contents
 
 
-# Create an instance that acts as a singleton and allows the CLI to read current contents for hints.
-global_manager = ConfigurationManager()
-original_configuration_contents = global_manager.original_configuration_contents
+@functools.lru_cache(maxsize=None)
+def get_global_manager(backend: Optional[str] = None) -> ConfigurationManager:
+    """
+    Get the instance that acts as a singleton, only creating it once it is first needed.
+    :param backend: The configuration backend, by default the one set by the environment (or otherwise YAML).
+    :return: The global configuration manager.
+    """
+    backend = (backend or os.environ.get(CONFIG_BACKEND_VARIABLE) or "yaml").lower()
+    if backend not in CONFIG_BACKENDS:
+        raise ValueError(f"Configuration backend '{backend}' not found: expected one of {CONFIG_BACKENDS}")
+
+    if backend == "sqlite":
+        from cascabel.configuration.sqlite_configuration_manager import SqliteConfigurationManager
+
+        return SqliteConfigurationManager()
+
+    return ConfigurationManager()
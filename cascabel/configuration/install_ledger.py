@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from cascabel.configuration.atomic_file import write_atomically
+
+LEDGER_FILE_NAME = "install-ledger.json"
+
+# Entries which change without affecting what is installed, such as the git directory on every fetch.
+FINGERPRINT_IGNORED_NAMES = {".git"}
+
+
+def fingerprint_directory(directory_path: Path) -> str:
+    """
+    Fingerprint the top level of a directory, from the names and modification times of its entries.
+
+    Entries changed by git itself (rather than by what is checked out) are
+    left out.
+    :param directory_path: The directory to fingerprint.
+    :return: The fingerprint, or an empty string if the directory cannot be read.
+    """
+    digest = hashlib.blake2b(os.fsencode(str(directory_path.absolute())), digest_size=16)
+    try:
+        with os.scandir(directory_path) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.name in FINGERPRINT_IGNORED_NAMES:
+                    continue
+                digest.update(b"\0" + os.fsencode(entry.name) + b"\0" +
+                              str(entry.stat(follow_symlinks=False).st_mtime_ns).encode())
+    except OSError:
+        return ""
+
+    return digest.hexdigest()
+
+
+class InstallLedger:
+    """
+    A record of the state each repository was last successfully installed from.
+
+    Each entry holds the installed commit, the installer type and a
+    fingerprint of the directory the installer ran within, so that installing
+    a repository again with all of them unchanged can be skipped.
+    """
+
+    def __init__(self, directory_path: Path) -> None:
+        """
+        Initialize the install ledger, reading any existing entries.
+        :param directory_path: The directory containing the ledger.
+        """
+        self.ledger_file_path = directory_path.joinpath(LEDGER_FILE_NAME)
+
+        # Guard the entries, as installers may record them from several threads at once.
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict] = self.read()
+        self.is_changed = False
+
+    def read(self) -> dict[str, dict]:
+        """
+        Read the entries of the ledger.
+        :return: The entries by repository URL, or an empty dictionary if there is no readable ledger.
+        """
+        try:
+            entries = json.loads(self.ledger_file_path.read_bytes())
+        except (OSError, ValueError):
+            return {}
+
+        return entries if isinstance(entries, dict) else {}
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        Get the state a repository was last installed from.
+        :param url: The repository URL.
+        :return: The installed state, or None if the repository has not been installed.
+        """
+        with self.lock:
+            return self.entries.get(url)
+
+    def is_unchanged(self, url: str, state: dict) -> bool:
+        """
+        Check whether a repository was last installed from the given state.
+        :param url: The repository URL.
+        :param state: The current state of the repository.
+        :return: Whether the state is unchanged since the last install.
+        """
+        return self.get(url) == state
+
+    def record(self, url: str, state: dict) -> None:
+        """
+        Record that a repository was installed from the given state.
+        :param url: The repository URL.
+        :param state: The installed state of the repository.
+        :return: None.
+        """
+        with self.lock:
+            if self.entries.get(url) != state:
+                self.entries[url] = state
+                self.is_changed = True
+
+    def write(self) -> None:
+        """
+        Write the ledger if any entry has changed since it was read.
+        :return: None.
+        """
+        with self.lock:
+            if not self.is_changed:
+                return
+
+            write_atomically(self.ledger_file_path, json.dumps(self.entries, indent=2, sort_keys=True).encode())
+            self.is_changed = False
@@ -0,0 +1,45 @@
+import marshal
+from pathlib import Path
+
+from cascabel.configuration.atomic_file import write_atomically
+
+LINK_INDEX_FILE_NAME = ".link-index"
+
+# The version of the link index format, changed whenever indexed entries would no longer be valid.
+LINK_INDEX_FORMAT = 1
+
+
+class LinkIndex:
+    """
+    The links found by the last verification of each stowed repository.
+
+    The index is only a cache: if it is missing or unreadable, then every
+    link is simply checked again.
+    """
+
+    def __init__(self, directory_path: Path) -> None:
+        """
+        Initialize the link index.
+        :param directory_path: The directory containing the link index.
+        """
+        self.index_file_path = directory_path.joinpath(LINK_INDEX_FILE_NAME)
+
+    def read(self) -> dict:
+        """
+        Read the indexed entries.
+        :return: The entries of each repository URL, or an empty dictionary if there is no readable index.
+        """
+        try:
+            index_format, entries = marshal.loads(self.index_file_path.read_bytes())
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+
+        return entries if index_format == LINK_INDEX_FORMAT and isinstance(entries, dict) else {}
+
+    def write(self, entries: dict) -> None:
+        """
+        Write the indexed entries.
+        :param entries: The entries of each repository URL.
+        :return: None.
+        """
+        write_atomically(self.index_file_path, marshal.dumps((LINK_INDEX_FORMAT, entries)))
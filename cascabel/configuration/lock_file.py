@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import yaml
+
+from cascabel.configuration.atomic_file import write_atomically
+from cascabel.configuration.configuration_manager import YamlDumper, YamlLoader
+
+LOCK_FILE_NAME = "repositories.lock"
+
+
+class LockFile:
+    """
+    A file of the exact commit resolved for each configured repository.
+
+    The lock file is written by resolving every remote head at once, so that
+    installing from it needs no remote queries at all.
+    """
+
+    def __init__(self, directory_path: Path) -> None:
+        """
+        Initialize the lock file.
+        :param directory_path: The directory containing the lock file.
+        """
+        self.lock_file_path = directory_path.joinpath(LOCK_FILE_NAME)
+
+    def exists(self) -> bool:
+        """
+        Check whether the lock file has been written.
+        :return: Whether the lock file exists.
+        """
+        return self.lock_file_path.exists()
+
+    def read(self) -> dict[str, dict]:
+        """
+        Read the lock file.
+        :return: A map of each repository URL to its locked branch and hash.
+        """
+        with open(self.lock_file_path.absolute(), "r") as stream:
+            contents = yaml.load(stream, Loader=YamlLoader)
+            if contents is None:
+                contents = {}
+
+            return contents
+
+    def read_hashes(self) -> dict[str, str]:
+        """
+        Read the locked hashes.
+        :return: A map of each repository URL to its locked hash.
+        """
+        return {url: entry["hash"] for url, entry in self.read().items() if entry.get("hash")}
+
+    def write(self, entries: dict[str, dict]) -> None:
+        """
+        Write the lock file.
+        :param entries: A map of each repository URL to its locked branch and hash.
+        :return: None.
+        """
+        # Write to a temporary file first, so that a failure never leaves a partially written lock file.
+        write_atomically(self.lock_file_path, yaml.dump(entries, Dumper=YamlDumper).encode())
@@ -0,0 +1,73 @@
+import json
+import threading
+from pathlib import Path
+from typing import Optional
+
+from cascabel.configuration.atomic_file import write_atomically
+
+MAINTENANCE_LOG_FILE_NAME = "maintenance-log.json"
+
+
+class MaintenanceLog:
+    """
+    A record of when the maintenance tasks of each repository last ran successfully.
+
+    The log lets repositories which were maintained recently be skipped
+    without running any git command within them.
+    """
+
+    def __init__(self, directory_path: Path) -> None:
+        """
+        Initialize the maintenance log, reading any existing entries.
+        :param directory_path: The directory containing the log.
+        """
+        self.log_file_path = directory_path.joinpath(MAINTENANCE_LOG_FILE_NAME)
+
+        # Guard the entries, as repositories may be maintained from several threads at once.
+        self.lock = threading.Lock()
+        self.entries: dict[str, float] = self.read()
+        self.is_changed = False
+
+    def read(self) -> dict[str, float]:
+        """
+        Read the entries of the log.
+        :return: The time each repository URL was last maintained, or an empty dictionary if there is no readable log.
+        """
+        try:
+            entries = json.loads(self.log_file_path.read_bytes())
+        except (OSError, ValueError):
+            return {}
+
+        return entries if isinstance(entries, dict) else {}
+
+    def get(self, url: str) -> Optional[float]:
+        """
+        Get when a repository was last maintained.
+        :param url: The repository URL.
+        :return: The time of the last maintenance, in seconds since the epoch, or None if it was never maintained.
+        """
+        with self.lock:
+            return self.entries.get(url)
+
+    def record(self, url: str, maintenance_time: float) -> None:
+        """
+        Record that a repository was maintained.
+        :param url: The repository URL.
+        :param maintenance_time: The time of the maintenance, in seconds since the epoch.
+        :return: None.
+        """
+        with self.lock:
+            self.entries[url] = maintenance_time
+            self.is_changed = True
+
+    def write(self) -> None:
+        """
+        Write the log if any entry has changed since it was read.
+        :return: None.
+        """
+        with self.lock:
+            if not self.is_changed:
+                return
+
+            write_atomically(self.log_file_path, json.dumps(self.entries, indent=2, sort_keys=True).encode())
+            self.is_changed = False
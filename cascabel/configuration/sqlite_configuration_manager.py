@@ -0,0 +1,239 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import yaml
+from loguru import logger
+
+from cascabel.configuration import DEFAULT_CONFIG_PATH
+from cascabel.configuration.atomic_file import write_atomically
+from cascabel.configuration.configuration_manager import CONFIG_FILE_NAME, ConfigurationManager, YamlDumper, \
+    YamlLoader
+
+DATABASE_FILE_NAME = "repositories.sqlite3"
+
+# The columns of the repositories table, in the order of the configuration of each repository.
+REPOSITORY_COLUMNS = ["type", "installation_directory", "order_place", "branch", "current_hash", "lock_hash",
+                      "execution_directory", "depends_on", "tags", "target_directory"]
+
+# The columns holding lists, which are stored as JSON.
+LIST_COLUMNS = {"depends_on", "tags"}
+
+# The values of any columns missing from the configuration of a repository, where they cannot be null.
+COLUMN_DEFAULTS = {"order_place": -1, "lock_hash": False}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repositories (
+    url TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    installation_directory TEXT NOT NULL,
+    order_place INTEGER NOT NULL DEFAULT -1,
+    branch TEXT,
+    current_hash TEXT,
+    lock_hash INTEGER NOT NULL DEFAULT 0,
+    execution_directory TEXT,
+    depends_on TEXT NOT NULL DEFAULT '[]',
+    tags TEXT NOT NULL DEFAULT '[]',
+    target_directory TEXT
+);
+CREATE INDEX IF NOT EXISTS repositories_type ON repositories (type);
+CREATE INDEX IF NOT EXISTS repositories_order_place ON repositories (order_place);
+CREATE INDEX IF NOT EXISTS repositories_installation_directory ON repositories (installation_directory);
+"""
+
+UPSERT_STATEMENT = (f"INSERT INTO repositories (url, {', '.join(REPOSITORY_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(REPOSITORY_COLUMNS) + 1))}) "
+                    f"ON CONFLICT (url) DO UPDATE SET "
+                    f"{', '.join(f'{column} = excluded.{column}' for column in REPOSITORY_COLUMNS)}")
+
+
+class SqliteConfigurationManager(ConfigurationManager):
+    """
+    A manager for the configuration, kept in an SQLite database rather than a YAML file.
+
+    Only the repositories changed since the last write are written, each as a
+    single row, so that writing a hash does not depend on the number of
+    repositories configured. The database is opened in WAL mode, so that other
+    processes can keep reading it while it is written.
+    """
+
+    configuration_file_name = DATABASE_FILE_NAME
+
+    def __init__(self, directory_path: Path = DEFAULT_CONFIG_PATH) -> None:
+        """
+        Initialize the configuration manager.
+
+        A new database is filled from the YAML configuration file, if there is
+        one.
+        :param directory_path: The directory to initialize the configuration.
+        """
+        # Open the database before anything is read from it.
+        #
+        # The connection is shared between the installer threads, which are serialized by the lock.
+        # Only a database which did not exist yet is filled from the YAML configuration file, so that a database
+        # emptied since is never filled again.
+        database_file_path = directory_path.joinpath(DATABASE_FILE_NAME)
+        is_new_database = not database_file_path.exists()
+
+        directory_path.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(database_file_path, timeout=30.0, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.__add_missing_columns()
+
+        super().__init__(directory_path)
+
+        yaml_file_path = directory_path.joinpath(CONFIG_FILE_NAME)
+        if is_new_database and yaml_file_path.exists():
+            self.import_configuration(yaml_file_path)
+            self.original_configuration_contents = self.configuration_contents
+
+    def __add_missing_columns(self) -> None:
+        """
+        Add any columns missing from a database created by an earlier version.
+        :return: None.
+        """
+        existing_columns = {row[1] for row in self.connection.execute("PRAGMA table_info(repositories)")}
+        for column in REPOSITORY_COLUMNS:
+            if column not in existing_columns:
+                logger.debug(f"Adding column '{column}' to the configuration database")
+                self.connection.execute(f"ALTER TABLE repositories ADD COLUMN {column} TEXT")
+
+    def _write_changes(self) -> None:
+        """
+        Write the repositories changed or removed since the last write, within a single transaction.
+
+        As only these rows are written, changes written by another process in
+        the meantime are kept.
+        :return: None.
+        """
+        with self.lock:
+            try:
+                with self.__transaction():
+                    self.connection.executemany(UPSERT_STATEMENT, [
+                        SqliteConfigurationManager.__to_row(url, self.configuration_contents[url]) for url in
+                        self.changed_urls])
+                    self.connection.executemany("DELETE FROM repositories WHERE url = ?",
+                                                [(url,) for url in self.removed_urls])
+            except sqlite3.Error as e:
+                logger.error(f"Error writing to configuration: {e}")
+                return
+
+            self.changed_urls.clear()
+            self.removed_urls.clear()
+            self._write_completion_index(
+                [url for url, in self.connection.execute("SELECT url FROM repositories ORDER BY url")])
+
+    @contextmanager
+    def __transaction(self) -> Iterator[None]:
+        """
+        Hold a write transaction, which is committed at the end of the block or rolled back on any error.
+        :return: An iterator for use as a context manager.
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    @staticmethod
+    def __to_row(url: str, repository_info: dict) -> tuple:
+        """
+        Convert the configuration of a repository to a row of the repositories table.
+        :param url: The repository URL.
+        :param repository_info: The configuration of the repository.
+        :return: The row.
+        """
+        return (url, *(json.dumps(repository_info.get(column) or []) if column in LIST_COLUMNS else
+                       repository_info.get(column, COLUMN_DEFAULTS.get(column)) for column in REPOSITORY_COLUMNS))
+
+    @staticmethod
+    def __from_row(row: tuple) -> dict:
+        """
+        Convert a row of the repositories table to the configuration of a repository.
+        :param row: The row, without the URL.
+        :return: The configuration of the repository.
+        """
+        repository_info = dict(zip(REPOSITORY_COLUMNS, row))
+        repository_info["lock_hash"] = bool(repository_info["lock_hash"])
+        for column in LIST_COLUMNS:
+            repository_info[column] = json.loads(repository_info[column])
+
+        return repository_info
+
+    def __load_configuration(self) -> dict:
+        """
+        Load every repository from the database.
+        :return: The configuration as a dictionary.
+        """
+        return {row[0]: SqliteConfigurationManager.__from_row(row[1:]) for row in self.connection.execute(
+            f"SELECT url, {', '.join(REPOSITORY_COLUMNS)} FROM repositories ORDER BY url")}
+
+    def read_configuration(self) -> dict:
+        """
+        Read the configuration from the database.
+        :return: The configuration as a dictionary.
+        """
+        with self.lock:
+            contents = self.__load_configuration()
+
+            self.changed_urls.clear()
+            self.removed_urls.clear()
+            self.configuration_contents = contents
+            if not self.completion_index.exists():
+                self._write_completion_index(contents)
+            return contents
+
+    def get_configuration(self, as_string: bool = True) -> Union[dict, str]:
+        """
+        Get the current configuration.
+        :param as_string: Return the configuration as a string.
+        :return: The configuration either as a string, or a dictionary.
+        """
+        with self.lock:
+            contents = self.__load_configuration()
+            if as_string:
+                return yaml.dump(contents, Dumper=YamlDumper)
+
+            return contents
+
+    def import_configuration(self, file_path: Path) -> int:
+        """
+        Replace the contents of the database with a YAML configuration file.
+        :param file_path: The path of the YAML configuration file.
+        :return: The number of repositories imported.
+        """
+        contents = yaml.load(file_path.read_bytes(), Loader=YamlLoader) or {}
+        with self.lock:
+            with self.__transaction():
+                self.connection.execute("DELETE FROM repositories")
+                self.connection.executemany(UPSERT_STATEMENT, [
+                    SqliteConfigurationManager.__to_row(url, repository_info) for url, repository_info in
+                    contents.items()])
+            self._write_completion_index(contents)
+            self.read_configuration()
+
+        logger.info(f"Imported {len(contents)} repositories from '{file_path}'")
+        return len(contents)
+
+    def export_configuration(self, file_path: Optional[Path] = None) -> int:
+        """
+        Write the contents of the database to a YAML configuration file.
+        :param file_path: The path of the YAML configuration file, by default the configuration file of the YAML
+        backend.
+        :return: The number of repositories exported.
+        """
+        file_path = file_path or self.directory_path.joinpath(CONFIG_FILE_NAME)
+        contents = self.get_configuration(as_string=False)
+
+        # Replace the file atomically, as it may be in use by the YAML backend.
+        write_atomically(file_path, yaml.dump(contents, Dumper=YamlDumper).encode() if contents else b"")
+
+        logger.info(f"Exported {len(contents)} repositories to '{file_path}'")
+        return len(contents)
@@ -1,10 +1,14 @@
+from typing import Optional
+
 from cascabel.configuration.configuration_manager import ConfigurationManager
+from cascabel.configuration.install_ledger import InstallLedger
+from cascabel.installation.installer import Installer
 from cascabel.installation.shell_installer import ShellInstaller
-from cascabel.installation.stow_installer import StowInstaller
+from cascabel.installation.stow_installer import GNU_STOW_BACKEND, StowInstaller
 from cascabel.repository import Repository
 
 # A list of all installers available.
-all_installers = [StowInstaller, ShellInstaller]
+all_installers: list[type[Installer]] = [StowInstaller, ShellInstaller]
 
 # A map of installation type to installer.
 installation_map = {}
@@ -13,6 +17,12 @@ for installer in all_installers:
 
 
 def initialize_installer(repository: Repository, configuration_manager: ConfigurationManager,
-                         show_warning_messages: bool = True):
+                         show_warning_messages: bool = True, ledger: Optional[InstallLedger] = None,
+                         force: bool = False, stow_backend: str = GNU_STOW_BACKEND, fast_status: bool = False):
     """Get the relevant installer by repository type."""
-    return installation_map[repository.type.value](repository, configuration_manager, show_warning_messages)
+    installer_class = installation_map[repository.type.value]
+    if installer_class is StowInstaller:
+        return StowInstaller(repository, configuration_manager, show_warning_messages, ledger, force,
+                             fast_status=fast_status, backend=stow_backend)
+
+    return installer_class(repository, configuration_manager, show_warning_messages, ledger, force, fast_status)
@@ -1,17 +1,56 @@
 import datetime
-import os
+import functools
+from dataclasses import replace
 from pathlib import Path
-from typing import Union
+from typing import Any, Optional, TypedDict, Union
 
 import git
-from git import Repo, Commit  # type: ignore
+from git import Repo  # type: ignore
 from loguru import logger
 
 from cascabel.configuration.configuration_manager import ConfigurationManager
+from cascabel.configuration.install_ledger import InstallLedger, fingerprint_directory
 from cascabel.repository import Repository
 from cascabel.repository_types import RepositoryTypeError, RepositoryTypes
 
 
+# The number of fields before the path of each kind of entry in `git status --porcelain=v2` output: changed, renamed or
+# copied, unmerged, untracked and ignored.
+STATUS_FIELD_COUNTS = {"1 ": 8, "2 ": 9, "u ": 10, "? ": 1, "! ": 1}
+
+
+# Settings which keep status fast within large working trees: the untracked cache, and the index version and other
+# defaults suited to many files. The built-in file system monitor is added wherever git supports it.
+FAST_STATUS_SETTINGS = {"core.untrackedCache": "true", "feature.manyFiles": "true"}
+FSMONITOR_SETTINGS = {"core.fsmonitor": "true"}
+
+
+class RepositoryStatus(TypedDict):
+    """
+    The status of a repository, as parsed from `git status --porcelain=v2 -z --branch`.
+
+    The branch is None when HEAD is detached, and the upstream and the
+    commits ahead of and behind it are None without an upstream.
+    """
+    paths: list[str]
+    head: Optional[str]
+    upstream: Optional[str]
+    ahead: Optional[int]
+    behind: Optional[int]
+
+
+@functools.lru_cache(maxsize=None)
+def is_fsmonitor_supported() -> bool:
+    """
+    Check whether git has the built-in file system monitor, which is only built on some platforms.
+    :return: Whether the built-in file system monitor is supported.
+    """
+    try:
+        return "feature: fsmonitor--daemon" in git.Git().version("--build-options")
+    except git.GitCommandError:
+        return False
+
+
 class InstallerError(Exception):
     """An error which occurred during installation logic."""
     pass
@@ -29,12 +68,16 @@ class Installer:
     installation_type: RepositoryTypes = RepositoryTypes.NONE
 
     def __init__(self, repository: Repository, configuration_manager: ConfigurationManager,
-                 show_warning_messages: bool = True):
+                 show_warning_messages: bool = True, ledger: Optional[InstallLedger] = None, force: bool = False,
+                 fast_status: bool = False):
         """
         Initialize the installer.
         :param repository: The repository to initialize.
         :param configuration_manager: The configuration manager used.
         :param show_warning_messages: Show potential warnings for risky actions.
+        :param ledger: The install ledger, used to skip installing repositories which are unchanged.
+        :param force: Install the repository even if it is unchanged since the last install.
+        :param fast_status: Configure a new clone to keep status fast within a large working tree.
         """
         if repository.type is not self.installation_type and self.installation_type is not RepositoryTypes.NONE:
             raise RepositoryTypeError(
@@ -43,10 +86,14 @@ class Installer:
         self.repository = repository
         self.configuration_manager = configuration_manager
         self.show_warning_messages = show_warning_messages
+        self.ledger = ledger
+        self.force = force
+        self.fast_status = fast_status
 
         self.git_repository: Union[Repo, None] = None
 
-        self.init_cwd = os.getcwd()
+        # Installers never change the process working directory, so that several may run at once: anything executed
+        # within the repository is given this directory explicitly.
         self.working_directory = self.repository.execution_directory or self.repository.installation_directory
 
     def __initialize_repository(self) -> Repo:
@@ -60,16 +107,29 @@ class Installer:
             # Repository does not exist.
 
             # Clone the repository.
-            logger.debug(
-                f"Recursively cloning repository '{self.repository.url}' to '{self.repository.installation_directory}'")
+            #
+            # Only the configured branch is cloned, and a locked hash is checked out directly instead of the branch.
+            locked_hash = self.repository.current_hash if self.repository.lock_hash else None
+            clone_options: dict[str, Any] = {"branch": self.repository.branch} if self.repository.branch else {}
+            logger.debug(f"Cloning repository '{self.repository.url}' to '{self.repository.installation_directory}'")
             try:
                 git_repository = Repo.clone_from(self.repository.url, self.repository.installation_directory,
-                                                 recursive=True)
+                                                 recursive=not locked_hash, no_checkout=bool(locked_hash),
+                                                 **clone_options)
             except Exception as e:
                 raise InstallerError(f"Unable to clone: {e}")
             logger.debug(
                 f"Repository '{self.repository.url}' cloned to directory '{self.repository.installation_directory}'")
 
+            if self.fast_status:
+                try:
+                    Installer.configure_fast_status(Path(self.repository.installation_directory))
+                except InstallerError as e:
+                    logger.warning(f"{e}: status may be slow")
+
+            if locked_hash:
+                self.__check_out_locked_hash(git_repository, locked_hash, checked_out=False)
+
         else:
             # Repository exists.
             logger.debug(
@@ -78,6 +138,10 @@ class Installer:
             # If expected, then update the repository.
             if self.repository.lock_hash:
                 logger.debug(f"Repository has hash locked: skipping pull")
+                if self.repository.current_hash:
+                    self.__check_out_locked_hash(git_repository, self.repository.current_hash)
+                else:
+                    logger.warning("Repository has hash locked without a current_hash: leaving checkout untouched")
             else:
                 # If a branch is specified, change to it now.
                 if self.repository.branch:
@@ -87,38 +151,41 @@ class Installer:
                     except Exception as e:
                         raise InstallerError(f"Unable to checkout branch '{self.repository.branch}': {e}")
 
-                active_branch = git_repository.active_branch
+                # A locked install leaves HEAD detached, so without a configured branch, return to the default branch.
+                elif git_repository.head.is_detached:
+                    default_branch = Installer.get_default_branch(git_repository)
+                    try:
+                        git_repository.git.checkout(default_branch)
+                    except git.GitCommandError as e:
+                        raise InstallerError(f"Unable to checkout default branch '{default_branch}': {e}")
+                    logger.debug(f"Switched from a detached HEAD to default branch '{default_branch}'")
 
-                # Get the latest local commit.
-                commits = git_repository.iter_commits()
-                latest_local_commit: Commit = commits.__next__()
+                active_branch = git_repository.active_branch
 
-                # Get the latest remote commit.
-                logger.debug(f"Getting latest origin commit on branch '{active_branch}'")
-                latest_origin_commit = ""
-                remote_heads = git.cmd.Git().ls_remote(self.repository.url, heads=True)
-                heads_list = remote_heads.split()
-                for index, element in enumerate(heads_list):
-                    if element == f"refs/heads/{active_branch}":
-                        latest_origin_commit = heads_list[index - 1]
+                # Get the latest remote commit, fetching only the active branch.
+                logger.debug(f"Fetching latest origin commit on branch '{active_branch}'")
+                latest_origin_commit = Installer.fetch_branch(git_repository, active_branch.name)
 
                 # If there is no latest origin commit, then assume that the branch is only local.
                 if not latest_origin_commit:
                     logger.warning(
                         f"Remote origin does not exist on branch '{active_branch}': skipping pull evaluation")
 
-                # If there is an origin commit, and it is not the same as the latest local commit, then attempt to get
-                # the latest origin commit.
-                if latest_local_commit.hexsha != latest_origin_commit:
-                    logger.debug(f"Pulling latest commit '{latest_origin_commit}'")
-                    git.Git(self.repository.installation_directory).pull("origin", active_branch)
+                # If there is an origin commit, and it is not the same as the latest local commit, then fast-forward
+                # to the commit which has just been fetched.
+                elif git_repository.head.commit.hexsha != latest_origin_commit:
+                    logger.debug(f"Fast-forwarding to latest commit '{latest_origin_commit}'")
+                    try:
+                        git_repository.git.merge(latest_origin_commit, ff_only=True)
+                    except git.GitCommandError as e:
+                        raise InstallerError(f"Unable to fast-forward branch '{active_branch}': {e}")
 
                 else:
                     logger.debug(f"Branch already at latest commit '{latest_origin_commit}'")
 
-                if not self.repository.current_hash or self.repository.current_hash != latest_origin_commit:
+                if latest_origin_commit and self.repository.current_hash != latest_origin_commit:
                     # Update the commit hash in the configuration.
-                    self.repository.current_hash = latest_origin_commit
+                    self.repository = replace(self.repository, current_hash=latest_origin_commit)
                     self.configuration_manager.write_repository(self.repository)
                     self.configuration_manager.write_configuration()
                     logger.debug("Updated current_hash value")
@@ -126,6 +193,40 @@ class Installer:
         self.git_repository = git_repository
         return git_repository
 
+    def __check_out_locked_hash(self, git_repository: Repo, locked_hash: str, checked_out: bool = True) -> None:
+        """
+        Check out the locked hash, only contacting the remote if the commit is not available locally.
+        :param git_repository: The git repository.
+        :param locked_hash: The locked hash.
+        :param checked_out: Whether the working tree has been checked out at all.
+        :return: None.
+        """
+        if checked_out and git_repository.head.is_valid() and git_repository.head.commit.hexsha == locked_hash:
+            logger.debug(f"Repository already at locked hash '{locked_hash}'")
+            return
+
+        if not Installer.has_commit(git_repository, locked_hash):
+            logger.debug(f"Locked hash '{locked_hash}' is not available locally: fetching from origin")
+            try:
+                git_repository.git.fetch("origin", locked_hash)
+            except git.GitCommandError:
+                # Not every remote allows fetching a commit directly, so fall back to fetching everything.
+                try:
+                    git_repository.git.fetch("origin")
+                except git.GitCommandError as e:
+                    raise InstallerError(f"Unable to fetch locked hash '{locked_hash}': {e}")
+
+            if not Installer.has_commit(git_repository, locked_hash):
+                raise InstallerError(f"Locked hash '{locked_hash}' does not exist on origin")
+
+        logger.debug(f"Checking out locked hash '{locked_hash}'")
+        try:
+            git_repository.git.checkout(locked_hash, detach=True)
+            if Path(self.repository.installation_directory).joinpath(".gitmodules").exists():
+                git_repository.git.submodule("update", "--init", "--recursive")
+        except git.GitCommandError as e:
+            raise InstallerError(f"Unable to checkout locked hash '{locked_hash}': {e}")
+
     def set_up(self) -> None:
         """
         Set up the installer.
@@ -133,16 +234,36 @@ class Installer:
         """
         self.__initialize_repository()
 
-        # Go to either the execution directory (if specified), or the installation directory.
-        os.chdir(self.working_directory)
+    def get_installed_state(self) -> dict:
+        """
+        Get the state the repository would be recorded as installed from.
+        :return: The checked out commit, the installer type and a fingerprint of the working directory.
+        """
+        head = self.git_repository.head if self.git_repository else None
+        return {"commit": head.commit.hexsha if head and head.is_valid() else None,
+                "type": self.repository.type.name,
+                "fingerprint": fingerprint_directory(Path(self.working_directory))}
+
+    def is_installed(self) -> bool:
+        """
+        Check whether the repository is unchanged since it was last installed.
+        :return: Whether installing the repository again can be skipped.
+        """
+        if self.force or not self.ledger:
+            return False
+
+        return self.ledger.is_unchanged(self.repository.url, self.get_installed_state())
 
-    def clean_up(self) -> None:
+    def record_installation(self) -> None:
         """
-        Clean up the installer.
+        Record that the repository has been installed.
+
+        The state is taken after installing, so that anything the installer
+        itself changed is not mistaken for a change next time.
         :return: None.
         """
-        # Change back to the original directory.
-        os.chdir(self.init_cwd)
+        if self.ledger:
+            self.ledger.record(self.repository.url, self.get_installed_state())
 
     @staticmethod
     def get_repository(repository_path: Path) -> Union[Repo, None]:
@@ -164,29 +285,192 @@ class Installer:
         return expected_repository
 
     @staticmethod
-    def push_changes(repository_path: Path,
-                     message: str = f"Update via cascabel at {datetime.datetime.now().isoformat()}") -> None:
+    def has_commit(git_repository: Repo, commit_hash: str) -> bool:
+        """
+        Check whether a commit exists within the local object database.
+        :param git_repository: The git repository.
+        :param commit_hash: The commit hash to find.
+        :return: Whether the commit exists locally.
+        """
+        try:
+            git_repository.git.cat_file("-e", f"{commit_hash}^{{commit}}")
+        except git.GitCommandError:
+            return False
+
+        return True
+
+    @staticmethod
+    def resolve_remote_commit(url: str, branch: Union[str, None] = None) -> str:
+        """
+        Resolve the latest commit of a remote branch without a local clone.
+        :param url: The remote repository URL.
+        :param branch: The branch to resolve, or None for the remote default branch.
+        :return: The latest commit on the branch.
+        """
+        ref = f"refs/heads/{branch}" if branch else "HEAD"
+        try:
+            remote_heads = str(git.cmd.Git().ls_remote(url, ref))
+        except git.GitCommandError as e:
+            raise InstallerError(f"Unable to query remote '{url}': {e}")
+
+        # Only match the exact ref, as ls-remote matches patterns by their trailing components.
+        for line in remote_heads.splitlines():
+            commit_hash, _, remote_ref = line.partition("\t")
+            if remote_ref == ref:
+                return commit_hash
+
+        raise InstallerError(f"Remote '{url}' does not have '{ref}'")
+
+    @staticmethod
+    def get_default_branch(git_repository: Repo) -> str:
+        """
+        Get the default branch of the origin remote, as recorded when the repository was cloned.
+        :param git_repository: The git repository.
+        :return: The name of the default branch.
+        """
+        try:
+            remote_head = git_repository.git.symbolic_ref("--short", "refs/remotes/origin/HEAD")
+        except git.GitCommandError:
+            # The remote head is not recorded by every clone, so ask the remote for it instead.
+            try:
+                git_repository.git.remote("set-head", "origin", "--auto")
+                remote_head = git_repository.git.symbolic_ref("--short", "refs/remotes/origin/HEAD")
+            except git.GitCommandError as e:
+                raise InstallerError(f"HEAD is detached and no branch is configured, and the default branch of "
+                                     f"origin is unknown: {e}")
+
+        return remote_head.partition("/")[2]
+
+    @staticmethod
+    def fetch_branch(git_repository: Repo, branch: str) -> str:
+        """
+        Fetch a single branch from the origin remote.
+        :param git_repository: The git repository to fetch into.
+        :param branch: The name of the branch to fetch.
+        :return: The latest origin commit on the branch, or an empty string if the origin does not have the branch.
+        """
+        remote_ref = f"refs/remotes/origin/{branch}"
+        try:
+            git_repository.git.fetch("origin", f"+refs/heads/{branch}:{remote_ref}")
+        except git.GitCommandError as e:
+            if "couldn't find remote ref" in str(e.stderr):
+                return ""
+            raise InstallerError(f"Unable to fetch branch '{branch}': {e}")
+
+        return git_repository.git.rev_parse(remote_ref)
+
+    @staticmethod
+    def parse_status(output: str) -> RepositoryStatus:
+        """
+        Parse the output of `git status --porcelain=v2 -z --branch`.
+        :param output: The output of the status command.
+        :return: The path of each changed, unmerged or untracked entry, the checked out branch, its upstream, and the
+        number of commits it is ahead of and behind the upstream.
+        """
+        status: RepositoryStatus = {"paths": [], "head": None, "upstream": None, "ahead": None, "behind": None}
+        records = iter(output.split("\0"))
+        for record in records:
+            # The branch headers compare the branch with its remote-tracking ref, as of the last fetch.
+            if record.startswith("# branch.head "):
+                head = record[len("# branch.head "):]
+                status["head"] = None if head == "(detached)" else head
+            elif record.startswith("# branch.upstream "):
+                status["upstream"] = record[len("# branch.upstream "):]
+            elif record.startswith("# branch.ab "):
+                ahead, behind = record[len("# branch.ab "):].split()
+                status["ahead"], status["behind"] = int(ahead), -int(behind)
+
+            # Each kind of entry has a fixed number of fields before its path, which may itself contain spaces.
+            field_count = STATUS_FIELD_COUNTS.get(record[:2])
+            if field_count is None:
+                continue
+            status["paths"].append(record.split(" ", field_count)[field_count])
+
+            # A renamed or copied entry is followed by its original path, as a separate record.
+            if record[:2] == "2 ":
+                next(records, None)
+
+        return status
+
+    @staticmethod
+    def get_status(repository_path: Path) -> RepositoryStatus:
+        """
+        Get the status of a repository from a single status command, without contacting its remote.
+        :param repository_path: The repository path.
+        :return: The status of the repository, as parsed by `parse_status`.
+        """
+        if not repository_path.is_dir():
+            raise InstallerError(f"No git repository at '{repository_path.absolute()}' to push changes")
 
+        try:
+            return Installer.parse_status(git.Git(repository_path).status("--porcelain=v2", "-z", "--branch"))
+        except git.GitCommandError as e:
+            raise InstallerError(f"Could not read the status of '{repository_path.absolute()}': {e}")
+
+    @staticmethod
+    def commit_changes(repository_path: Path, message: Optional[str] = None) -> None:
         """
-        Push changes made to a repository at the specified path.
+        Commit every change made to a repository at the specified path, without pushing it.
         :param repository_path: The expected repository path.
-        :param message: The commit message.
+        :param message: The commit message, by default noting the time of the commit.
         :return: None.
         """
-        expected_repository = Installer.get_repository(repository_path)
-        if not expected_repository:
-            raise InstallerError(f"No git repository at '{repository_path.absolute()}' to push changes")
+        repository_git = git.Git(repository_path)
+        try:
+            # Add all the files when committing.
+            repository_git.add(all=True)
+            repository_git.commit("-m", message or f"Update via cascabel at {datetime.datetime.now().isoformat()}")
+        except git.GitCommandError as e:
+            raise InstallerError(f"Could not commit changes: {e}")
 
-        # Check for both diff and if there are any untrack files.
-        if not expected_repository.index.diff("HEAD") and not expected_repository.untracked_files:
-            logger.info(f"No changes to repository located at '{repository_path.absolute()}': skipping")
-            return
+    @staticmethod
+    def configure_fast_status(repository_path: Path) -> dict[str, str]:
+        """
+        Configure a repository to keep status fast within a large working tree.
+        :param repository_path: The repository path.
+        :return: The settings which were changed.
+        """
+        settings = {**FAST_STATUS_SETTINGS, **(FSMONITOR_SETTINGS if is_fsmonitor_supported() else {})}
+        repository_git = git.Git(repository_path)
+        try:
+            # Only change the settings which differ, so that configuring a repository again changes nothing.
+            current_settings = {}
+            for line in repository_git.config("--local", "--get-regexp", "|".join(
+                    f"^{key.lower().replace('.', '[.]')}$" for key in settings), with_exceptions=False).splitlines():
+                key, _, value = line.partition(" ")
+                current_settings[key.lower()] = value
+
+            changed_settings = {key: value for key, value in settings.items() if
+                                current_settings.get(key.lower()) != value}
+            for key, value in changed_settings.items():
+                repository_git.config("--local", key, value)
+        except git.GitCommandError as e:
+            raise InstallerError(f"Could not configure repository at '{repository_path.absolute()}': {e}")
+
+        if changed_settings:
+            logger.debug(f"Configured {changed_settings} for repository at '{repository_path.absolute()}'")
+        return changed_settings
 
+    @staticmethod
+    def get_remote_url(repository_path: Path) -> str:
+        """
+        Get the URL of the origin remote of a repository.
+        :param repository_path: The repository path.
+        :return: The URL of the origin remote.
+        """
+        try:
+            return git.Git(repository_path).remote("get-url", "origin")
+        except git.GitCommandError as e:
+            raise InstallerError(f"No origin remote for repository at '{repository_path.absolute()}': {e}")
+
+    @staticmethod
+    def push_commits(repository_path: Path) -> None:
+        """
+        Push the commits of a repository to its origin remote.
+        :param repository_path: The repository path.
+        :return: None.
+        """
         try:
-            # Add all the files when pushing.
-            expected_repository.git.add(all=True)
-            expected_repository.index.commit(message)
-            origin = expected_repository.remote(name="origin")
-            origin.push()
-        except Exception as e:
+            git.Git(repository_path).push("origin")
+        except git.GitCommandError as e:
             raise InstallerError(f"Could not push changes: {e}")
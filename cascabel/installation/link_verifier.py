@@ -0,0 +1,219 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+
+from loguru import logger
+
+from cascabel.configuration.install_ledger import InstallLedger
+from cascabel.configuration.link_index import LinkIndex
+from cascabel.installation.stow_engine import get_ignore_list
+from cascabel.installation.stow_installer import get_target_directory
+from cascabel.repository import Repository
+
+# The status of a stowed link: pointing at its source, absent, pointing at a source which no longer exists, or
+# replaced by something else.
+OK = "ok"
+MISSING = "missing"
+BROKEN = "broken"
+HIJACKED = "hijacked"
+
+# A real directory standing in for a directory of the package, whose contents are linked individually.
+UNFOLDED = "unfolded"
+
+
+def get_directory_stat(path: str) -> Optional[tuple[int, int]]:
+    """
+    Get what identifies the contents of a directory: its inode and modification time.
+    :param path: The path of the directory.
+    :return: The inode and modification time, or None if there is no such directory.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def get_link_status(target_path: str, source_path: str) -> str:
+    """
+    Get the status of the path a source within a package is stowed to.
+    :param target_path: The stowed path within the target directory.
+    :param source_path: The path within the package.
+    :return: The status of the stowed path.
+    """
+    try:
+        link_destination = os.readlink(target_path)
+    except FileNotFoundError:
+        return MISSING
+    except OSError:
+        # Anything other than a link is only expected where a directory of the package was unfolded.
+        return UNFOLDED if os.path.isdir(target_path) and not os.path.islink(source_path) and \
+            os.path.isdir(source_path) else HIJACKED
+
+    resolved_path = os.path.normpath(os.path.join(os.path.dirname(target_path), link_destination))
+    if resolved_path != source_path and os.path.realpath(target_path) != os.path.realpath(source_path):
+        return HIJACKED if os.path.lexists(resolved_path) else BROKEN
+
+    return OK if os.path.lexists(source_path) else BROKEN
+
+
+class LinkVerifier:
+    """
+    A verifier of the links stowed from each repository, reporting any which have drifted.
+
+    Every link found is indexed along with the inode and modification time of
+    each directory walked to find it. Adding, removing or replacing an entry
+    changes the modification time of its directory, so a later verification
+    only rechecks the links within directories which have changed, and walks a
+    package again only when its own directories have changed.
+    """
+
+    def __init__(self, index: LinkIndex, ledger: Optional[InstallLedger] = None, jobs: int = 8,
+                 full: bool = False) -> None:
+        """
+        Initialize the verifier.
+        :param index: The index of the links found by the last verification.
+        :param ledger: The install ledger, so that the links of a reinstalled repository are found again.
+        :param jobs: Check up to this many packages at once.
+        :param full: Check every link, ignoring the index.
+        """
+        self.index = index
+        self.ledger = ledger
+        self.jobs = jobs
+        self.full = full
+
+    def verify(self, repositories: Iterable[Repository]) -> dict[str, list[tuple[str, str, str]]]:
+        """
+        Verify the links stowed from repositories, and index the links found.
+        :param repositories: The stowed repositories.
+        :return: The status, stowed path and source path of each link with a problem, by repository URL.
+        """
+        previous_entries = {} if self.full else self.index.read()
+        entries: dict[str, dict] = {}
+        tasks = []
+        for repository in repositories:
+            working_directory = os.path.abspath(repository.execution_directory or repository.installation_directory)
+            target_directory = os.path.abspath(get_target_directory(repository))
+            installed_state = self.ledger.get(repository.url) if self.ledger else None
+            key = (installed_state.get("commit") if installed_state else None, working_directory, target_directory)
+
+            # Reuse the previous entry only if the repository is stowed from and to the same place, from the same
+            # commit, and no package has been added or removed since.
+            previous_entry = previous_entries.get(repository.url)
+            root_stat = get_directory_stat(working_directory)
+            if not previous_entry or previous_entry["key"] != key or previous_entry["root"] != root_stat:
+                previous_entry = {"packages": {}}
+
+            try:
+                package_names = sorted(entry.name for entry in os.scandir(working_directory) if
+                                       entry.is_dir() and entry.name[0] != ".")
+            except OSError as e:
+                logger.error(f"Cannot read repository '{repository.url}' at '{working_directory}': {e}")
+                continue
+
+            entries[repository.url] = {"key": key, "root": root_stat, "packages": {}}
+            for package_name in package_names:
+                tasks.append((repository.url, package_name, os.path.join(working_directory, package_name),
+                              target_directory, previous_entry["packages"].get(package_name)))
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            package_entries = list(executor.map(lambda task: LinkVerifier.__verify_package(*task[2:]), tasks))
+
+        problems: dict[str, list[tuple[str, str, str]]] = {}
+        for (url, package_name, *_), package_entry in zip(tasks, package_entries):
+            entries[url]["packages"][package_name] = package_entry
+            problems.setdefault(url, []).extend(
+                (status, target_path, source_path) for target_path, source_path, status in package_entry["nodes"] if
+                status != OK)
+
+        try:
+            self.index.write(entries)
+        except OSError as e:
+            logger.debug(f"Could not write link index: {e}")
+
+        return {url: url_problems for url, url_problems in problems.items() if url_problems}
+
+    @staticmethod
+    def __verify_package(package_directory: str, target_directory: str, previous_entry: Optional[dict]) -> dict:
+        """
+        Verify the links stowed from a package, rechecking only what has changed since the previous verification.
+        :param package_directory: The directory of the package.
+        :param target_directory: The directory the package is stowed into.
+        :param previous_entry: The entry of the package from the previous verification, if any.
+        :return: The entry of the package.
+        """
+        if not previous_entry:
+            return LinkVerifier.__scan_package(package_directory, target_directory)
+
+        changed_directories = {directory for directory, stat in previous_entry["directories"].items() if
+                               get_directory_stat(directory) != stat}
+
+        # A changed directory within the package may hold entries which have never been linked, so walk it again.
+        if any(directory == package_directory or directory.startswith(package_directory + os.sep) for directory in
+               changed_directories):
+            return LinkVerifier.__scan_package(package_directory, target_directory, previous_entry["nodes"])
+
+        nodes = []
+        for target_path, source_path, status in previous_entry["nodes"]:
+            if status != OK or os.path.dirname(target_path) in changed_directories:
+                status = get_link_status(target_path, source_path)
+
+                # A link which has been replaced by an unfolded directory needs its contents checked as well.
+                if status == UNFOLDED:
+                    return LinkVerifier.__scan_package(package_directory, target_directory, previous_entry["nodes"])
+            nodes.append((target_path, source_path, status))
+
+        return {"nodes": nodes, "directories": previous_entry["directories"]}
+
+    @staticmethod
+    def __scan_package(package_directory: str, target_directory: str,
+                       previous_nodes: Iterable[tuple[str, str, str]] = ()) -> dict:
+        """
+        Check every link stowed from a package.
+        :param package_directory: The directory of the package.
+        :param target_directory: The directory the package is stowed into.
+        :param previous_nodes: The links found by the previous verification, if any.
+        :return: The entry of the package.
+        """
+        ignore_list = get_ignore_list(Path(package_directory))
+        nodes = []
+        directories = {}
+
+        # Walk the package alongside the target, descending only where a directory of the package has been unfolded.
+        pending = [(package_directory, target_directory, "")]
+        while pending:
+            source_directory, target_subdirectory, relative_path = pending.pop()
+
+            # Take the stats before reading the directories, so that anything changed meanwhile is checked next time.
+            directories[source_directory] = get_directory_stat(source_directory)
+            directories[target_subdirectory] = get_directory_stat(target_subdirectory)
+            try:
+                with os.scandir(source_directory) as source_entries:
+                    names = sorted(entry.name for entry in source_entries)
+            except OSError as e:
+                logger.warning(f"Cannot read '{source_directory}': {e}")
+                continue
+
+            for name in names:
+                entry_path = f"{relative_path}/{name}"
+                if ignore_list.is_ignored(entry_path, name):
+                    continue
+
+                source_path = os.path.join(source_directory, name)
+                target_path = os.path.join(target_subdirectory, name)
+                status = get_link_status(target_path, source_path)
+                if status == UNFOLDED:
+                    pending.append((source_path, target_path, entry_path))
+                else:
+                    nodes.append((target_path, source_path, status))
+
+        # A link whose source has since been removed from the package is no longer found by walking it, but is left
+        # dangling until it is removed as well.
+        found_paths = {target_path for target_path, _, _ in nodes}
+        for target_path, source_path, _ in previous_nodes:
+            if target_path not in found_paths and get_link_status(target_path, source_path) == BROKEN:
+                nodes.append((target_path, source_path, BROKEN))
+
+        return {"nodes": nodes, "directories": directories}
@@ -0,0 +1,117 @@
+import functools
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+
+from loguru import logger
+
+from cascabel.configuration.maintenance_log import MaintenanceLog
+from cascabel.installation.installer import Installer, InstallerError
+from cascabel.repository import Repository
+
+# The git maintenance tasks run within each repository: writing the commit-graph, packing (and then pruning) loose
+# objects, and repacking the packs incrementally behind a multi-pack-index.
+MAINTENANCE_TASKS = ["commit-graph", "loose-objects", "incremental-repack"]
+
+# The minimum time between the maintenance tasks of a repository, in seconds.
+DEFAULT_MAINTENANCE_INTERVAL = 24 * 60 * 60
+
+
+@functools.lru_cache(maxsize=None)
+def get_low_priority_prefix() -> list[str]:
+    """
+    Get the prefix of a command which runs it at the lowest CPU and I/O priority, using whichever tools are available.
+    :return: The prefix of the command.
+    """
+    prefix = []
+    if shutil.which("ionice"):
+        prefix += ["ionice", "-c", "3"]
+    if shutil.which("nice"):
+        prefix += ["nice", "-n", "19"]
+
+    return prefix
+
+
+def run_maintenance_tasks(repository_path: Path) -> None:
+    """
+    Run the git maintenance tasks within a repository, at a low priority.
+    :param repository_path: The repository path.
+    :return: None.
+    """
+    # Repacking fails without any pack to repack, and git runs it before packing the loose objects, so a repository
+    # with only loose objects (such as a fresh local clone) is only repacked once they have been packed.
+    tasks = MAINTENANCE_TASKS
+    pack_directory = repository_path.joinpath(".git", "objects", "pack")
+    if pack_directory.is_dir() and not any(pack_directory.glob("*.pack")):
+        tasks = [task for task in tasks if task != "incremental-repack"]
+
+    command = get_low_priority_prefix() + ["git", "-C", str(repository_path), "maintenance", "run", "--quiet",
+                                           *(f"--task={task}" for task in tasks)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode:
+        raise InstallerError(f"Could not run maintenance tasks: {result.stderr.strip()}")
+
+
+def maintain_repository(repository: Repository, log: Optional[MaintenanceLog] = None,
+                        interval: float = DEFAULT_MAINTENANCE_INTERVAL, force: bool = False,
+                        configure: bool = True) -> bool:
+    """
+    Maintain a single cloned repository, logging rather than raising any error.
+    :param repository: The repository.
+    :param log: The maintenance log, used to skip repositories which were maintained recently.
+    :param interval: The minimum time between the maintenance tasks of the repository, in seconds.
+    :param force: Run the maintenance tasks even if the repository was maintained recently.
+    :param configure: Configure the repository to keep status fast.
+    :return: Whether the repository was maintained, or needs no maintenance.
+    """
+    repository_path = Path(repository.installation_directory)
+    if not repository_path.joinpath(".git").exists():
+        logger.info(f"Repository '{repository.url}' is not cloned yet: skipping")
+        return True
+
+    # Check the log before running anything, so that a recently maintained repository costs no git command.
+    last_maintenance_time = log.get(repository.url) if log else None
+    if not force and last_maintenance_time and time.time() - last_maintenance_time < interval:
+        logger.debug(f"Repository '{repository.url}' was maintained recently: skipping")
+        return True
+
+    try:
+        if configure:
+            Installer.configure_fast_status(repository_path)
+
+        logger.info(f"Running maintenance tasks for repository '{repository.url}'")
+        run_maintenance_tasks(repository_path)
+    except InstallerError as e:
+        logger.error(f"{e}: skipping repository '{repository.url}'")
+        return False
+
+    if log:
+        log.record(repository.url, time.time())
+    return True
+
+
+def maintain_repositories(repositories: Iterable[Repository], jobs: int = 1, log: Optional[MaintenanceLog] = None,
+                          interval: float = DEFAULT_MAINTENANCE_INTERVAL, force: bool = False,
+                          configure: bool = True) -> list[str]:
+    """
+    Maintain cloned repositories, several at once.
+
+    Each repository is configured to keep status fast within a large working
+    tree, as new clones are with `install --fast-status`, and has its git
+    maintenance tasks run at a low priority unless they ran recently.
+    :param repositories: The repositories.
+    :param jobs: The maximum number of repositories to maintain at once.
+    :param log: The maintenance log, used to skip repositories which were maintained recently.
+    :param interval: The minimum time between the maintenance tasks of each repository, in seconds.
+    :param force: Run the maintenance tasks even of repositories which were maintained recently.
+    :param configure: Configure the repositories to keep status fast.
+    :return: The URLs of any repositories which failed to be maintained.
+    """
+    repositories = list(repositories)
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        results = list(executor.map(lambda r: maintain_repository(r, log, interval, force, configure), repositories))
+
+    return [repository.url for repository, is_maintained in zip(repositories, results) if not is_maintained]
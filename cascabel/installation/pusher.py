@@ -0,0 +1,171 @@
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from cascabel.installation.installer import Installer, InstallerError, RepositoryStatus
+
+# The result of pushing each repository: pushed, with nothing to push, committed locally but not pushed, or not even
+# committed.
+PUSHED = "pushed"
+UNCHANGED = "unchanged"
+PUSH_FAILED = "committed locally, but failed to push"
+COMMIT_FAILED = "failed to commit"
+FAILED_RESULTS = {PUSH_FAILED, COMMIT_FAILED}
+
+# A repository which has been committed (or was already ahead of its remote), and is waiting to be pushed.
+COMMITTED = "committed"
+
+DEFAULT_HOST_JOBS = 4
+
+
+def get_remote_host(url: str) -> str:
+    """
+    Get the host of a remote URL, so that pushes to the same host can be limited.
+    :param url: The remote URL, either as a URL or in the SCP-like syntax of SSH.
+    :return: The host, or an empty string for a local remote.
+    """
+    if "://" in url:
+        return urlsplit(url).hostname or ""
+
+    # The SCP-like syntax has a colon before any slash, such as 'git@github.com:user/repository.git'.
+    host, separator, _ = url.partition(":")
+    if separator and "/" not in host:
+        return host.rpartition("@")[2]
+
+    return ""
+
+
+def commit_repository(repository_path: Path, message: Optional[str] = None) -> tuple[str, str]:
+    """
+    Commit the changes of a single repository locally, logging rather than raising any error.
+
+    Only a single status command is run for a repository which has neither
+    changes to commit nor commits its remote-tracking ref does not have.
+    :param repository_path: The repository path.
+    :param message: The commit message, by default noting the time of the commit.
+    :return: The result of the commit, and the host to push to if there is anything to push.
+    """
+    try:
+        status = Installer.get_status(repository_path)
+        if not status["paths"] and not status["ahead"]:
+            logger.info(f"No changes to repository located at '{repository_path.absolute()}': skipping")
+            return UNCHANGED, ""
+
+        if status["paths"]:
+            Installer.commit_changes(repository_path, message)
+    except InstallerError as e:
+        logger.error(f"{e}: skipping repository at '{repository_path.absolute()}'")
+        return COMMIT_FAILED, ""
+
+    # The remote-tracking ref is only as recent as the last fetch, so the remote may have moved on since.
+    if status["behind"]:
+        logger.warning(f"Repository at '{repository_path.absolute()}' is {status['behind']} commits behind "
+                       f"'{status['upstream']}': the push may be rejected")
+
+    try:
+        return COMMITTED, get_remote_host(Installer.get_remote_url(repository_path))
+    except InstallerError as e:
+        logger.error(f"{e}: keeping the commit of repository at '{repository_path.absolute()}' locally")
+        return PUSH_FAILED, ""
+
+
+def get_repository_statuses(repository_paths: Iterable[Path],
+                            jobs: int = 1) -> dict[Path, Optional[RepositoryStatus]]:
+    """
+    Get the status of repositories without contacting any remote, several at once.
+    :param repository_paths: The repository paths.
+    :param jobs: The maximum number of repositories to check at once.
+    :return: The status of each repository, in the given order, or None if it could not be read.
+    """
+    def get_status(repository_path: Path) -> Optional[RepositoryStatus]:
+        try:
+            return Installer.get_status(repository_path)
+        except InstallerError as e:
+            logger.error(f"{e}: skipping repository at '{repository_path.absolute()}'")
+            return None
+
+    repository_paths = list(repository_paths)
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        return dict(zip(repository_paths, executor.map(get_status, repository_paths)))
+
+
+def push_repository(repository_path: Path) -> str:
+    """
+    Push the commits of a single repository, logging rather than raising any error.
+    :param repository_path: The repository path.
+    :return: The result of the push.
+    """
+    try:
+        Installer.push_commits(repository_path)
+    except InstallerError as e:
+        logger.error(f"{e}: keeping the commit of repository at '{repository_path.absolute()}' locally")
+        return PUSH_FAILED
+
+    logger.info(f"Pushed repository at '{repository_path.absolute()}'")
+    return PUSHED
+
+
+def push_by_host(hosts: dict[Path, str], jobs: int = 1, host_jobs: int = DEFAULT_HOST_JOBS) -> dict[Path, str]:
+    """
+    Push repositories several at once, with only a limited number pushing to the same host at a time.
+    :param hosts: The host each repository pushes to, in the order to push them.
+    :param jobs: The maximum number of repositories to push at once.
+    :param host_jobs: The maximum number of repositories to push to the same host at once.
+    :return: The result of pushing each repository.
+    """
+    queued = list(hosts)
+    running_by_host: Counter = Counter()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        running: dict[Future, Path] = {}
+        while queued or running:
+            # Start the first queued repositories whose host has a free connection, as long as there are free workers.
+            still_queued = []
+            for repository_path in queued:
+                host = hosts[repository_path]
+                if len(running) < max(jobs, 1) and running_by_host[host] < max(host_jobs, 1):
+                    running_by_host[host] += 1
+                    running[executor.submit(push_repository, repository_path)] = repository_path
+                else:
+                    still_queued.append(repository_path)
+            queued = still_queued
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                repository_path = running.pop(future)
+                running_by_host[hosts[repository_path]] -= 1
+                results[repository_path] = future.result()
+
+    return results
+
+
+def push_repositories(repository_paths: Iterable[Path], message: Optional[str] = None, jobs: int = 1,
+                      host_jobs: int = DEFAULT_HOST_JOBS) -> dict[Path, str]:
+    """
+    Commit the changes of repositories locally, and then push them.
+
+    Every repository is committed before any is pushed, so that the commits
+    are kept even if a remote is slow or unreachable. Each repository is
+    checked with a single status command, so that a repository with nothing
+    to commit and no commits ahead of its remote-tracking ref is skipped
+    without any further git commands.
+    :param repository_paths: The repository paths.
+    :param message: The commit message, by default noting the time of the commit.
+    :param jobs: The maximum number of repositories to commit or push at once.
+    :param host_jobs: The maximum number of repositories to push to the same host at once.
+    :return: The result of each repository, in the given order.
+    """
+    repository_paths = list(repository_paths)
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        commits = list(executor.map(lambda path: commit_repository(path, message), repository_paths))
+
+    results = {path: result for path, (result, _) in zip(repository_paths, commits)}
+    pushed = push_by_host({path: host for path, (result, host) in zip(repository_paths, commits) if
+                           result == COMMITTED}, jobs, host_jobs)
+    results.update(pushed)
+
+    return results
@@ -0,0 +1,191 @@
+import heapq
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from loguru import logger
+
+from cascabel.configuration.configuration_manager import ConfigurationManager
+from cascabel.configuration.install_ledger import InstallLedger
+from cascabel.installation import initialize_installer
+from cascabel.installation.stow_installer import GNU_STOW_BACKEND
+from cascabel.installation.installer import InstallerError
+from cascabel.repository import Repository
+
+
+class DependencyError(Exception):
+    """An error in the dependencies between repositories."""
+    pass
+
+
+def build_dependency_graph(repositories: list[Repository]) -> dict[str, set[str]]:
+    """
+    Build the dependency graph of the given repositories.
+
+    Only dependencies on the given repositories are kept: anything else (such
+    as an excluded repository) is assumed to already be installed.
+    :param repositories: The repositories to build the graph from.
+    :return: A map of each repository URL to the URLs it depends on.
+    """
+    urls = {repository.url for repository in repositories}
+
+    graph = {}
+    for repository in repositories:
+        dependencies = set()
+        for dependency in repository.depends_on:
+            if dependency == repository.url:
+                raise DependencyError(f"Repository '{repository.url}' depends on itself")
+            if dependency in urls:
+                dependencies.add(dependency)
+            else:
+                logger.debug(f"Dependency '{dependency}' of '{repository.url}' is not being installed: ignoring")
+        graph[repository.url] = dependencies
+
+    return graph
+
+
+def invert_dependency_graph(graph: dict[str, set[str]]) -> dict[str, list[str]]:
+    """
+    Invert a dependency graph.
+    :param graph: A map of each repository URL to the URLs it depends on.
+    :return: A map of each repository URL to the URLs depending on it.
+    """
+    dependents: dict[str, list[str]] = {url: [] for url in graph}
+    for url, dependencies in graph.items():
+        for dependency in dependencies:
+            dependents[dependency].append(url)
+
+    return dependents
+
+
+def find_dependency_cycle(graph: dict[str, set[str]]) -> list[str]:
+    """
+    Find the repositories which can never be started because of a dependency cycle.
+    :param graph: A map of each repository URL to the URLs it depends on.
+    :return: The URLs within or behind a cycle, or an empty list if there is none.
+    """
+    remaining = {url: len(dependencies) for url, dependencies in graph.items()}
+    dependents = invert_dependency_graph(graph)
+
+    # Repeatedly remove every repository with no remaining dependencies.
+    ready = [url for url, count in remaining.items() if not count]
+    while ready:
+        url = ready.pop()
+        del remaining[url]
+        for dependent in dependents[url]:
+            remaining[dependent] -= 1
+            if not remaining[dependent]:
+                ready.append(dependent)
+
+    return sorted(remaining)
+
+
+def run_in_dependency_order(repositories: list[Repository], action: Callable[[Repository], bool],
+                            jobs: int = 1) -> list[str]:
+    """
+    Run an action over repositories, starting each as soon as everything it depends on has finished.
+
+    Repositories which are ready at the same time are started in order of
+    their order place. If the action fails for a repository, then everything
+    depending on it is skipped.
+    :param repositories: The repositories to run the action over.
+    :param action: The action to run, returning whether it succeeded.
+    :param jobs: The maximum number of repositories to run at once.
+    :return: The URLs of any repositories which failed or were skipped.
+    """
+    graph = build_dependency_graph(repositories)
+    cycle = find_dependency_cycle(graph)
+    if cycle:
+        raise DependencyError(f"Dependency cycle between repositories {cycle}")
+
+    by_url = {repository.url: repository for repository in repositories}
+    position = {repository.url: index for index, repository in enumerate(repositories)}
+    remaining = {url: len(dependencies) for url, dependencies in graph.items()}
+    dependents = invert_dependency_graph(graph)
+
+    # Keep the ready repositories ordered by their order place, and then by their original position.
+    ready = [(by_url[url].order_place, position[url], url) for url, count in remaining.items() if not count]
+    heapq.heapify(ready)
+
+    failed_urls: set[str] = set()
+
+    def skip_dependents(url: str) -> None:
+        for dependent in dependents[url]:
+            if dependent not in failed_urls:
+                logger.error(f"Dependency '{url}' did not succeed: skipping repository '{dependent}'")
+                failed_urls.add(dependent)
+                skip_dependents(dependent)
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        running: dict[Future, str] = {}
+        while ready or running:
+            # Start as many ready repositories as there are free workers.
+            while ready and len(running) < max(jobs, 1):
+                url = heapq.heappop(ready)[2]
+                running[executor.submit(action, by_url[url])] = url
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = running.pop(future)
+                if not future.result():
+                    failed_urls.add(url)
+                    skip_dependents(url)
+                    continue
+
+                for dependent in dependents[url]:
+                    remaining[dependent] -= 1
+                    if not remaining[dependent] and dependent not in failed_urls:
+                        heapq.heappush(ready, (by_url[dependent].order_place, position[dependent], dependent))
+
+    return [repository.url for repository in repositories if repository.url in failed_urls]
+
+
+def install_repository(repository: Repository, configuration_manager: ConfigurationManager,
+                       show_warning_messages: bool = True, ledger: Optional[InstallLedger] = None,
+                       force: bool = False, stow_backend: str = GNU_STOW_BACKEND,
+                       fast_status: bool = False) -> bool:
+    """
+    Install a single repository, reporting any installation error.
+    :param repository: The repository to install.
+    :param configuration_manager: The configuration manager used.
+    :param show_warning_messages: Show potential warnings for risky actions.
+    :param ledger: The install ledger, used to skip installing repositories which are unchanged.
+    :param force: Install the repository even if it is unchanged since the last install.
+    :param stow_backend: The backend used to stow packages.
+    :param fast_status: Configure a new clone to keep status fast within a large working tree.
+    :return: Whether the repository was installed.
+    """
+    try:
+        installer = initialize_installer(repository, configuration_manager, show_warning_messages, ledger, force,
+                                         stow_backend, fast_status)
+        installer.install()
+    except InstallerError as err:
+        logger.error(f"{err}: skipping repository '{repository.url}'")
+        return False
+    except Exception as err:
+        # Any other error is still only the failure of this repository, so it must not stop the others.
+        logger.exception(f"Unexpected error installing repository '{repository.url}': {err!r}: skipping repository")
+        return False
+
+    return True
+
+
+def install_repositories(repositories: list[Repository], configuration_manager: ConfigurationManager,
+                         show_warning_messages: bool = True, jobs: int = 1, ledger: Optional[InstallLedger] = None,
+                         force: bool = False, stow_backend: str = GNU_STOW_BACKEND,
+                         fast_status: bool = False) -> list[str]:
+    """
+    Install repositories, starting each as soon as the repositories it depends on are installed.
+    :param repositories: The repositories to install.
+    :param configuration_manager: The configuration manager used.
+    :param show_warning_messages: Show potential warnings for risky actions.
+    :param jobs: The maximum number of repositories to install at once.
+    :param ledger: The install ledger, used to skip installing repositories which are unchanged.
+    :param force: Install repositories even if they are unchanged since the last install.
+    :param stow_backend: The backend used to stow packages.
+    :param fast_status: Configure new clones to keep status fast within large working trees.
+    :return: The URLs of any repositories which failed to install.
+    """
+    return run_in_dependency_order(
+        repositories,
+        lambda r: install_repository(r, configuration_manager, show_warning_messages, ledger, force, stow_backend,
+                                     fast_status), jobs)
@@ -1,4 +1,5 @@
 import subprocess
+import threading
 from pathlib import Path
 
 import click
@@ -9,6 +10,9 @@ from cascabel.repository_types import RepositoryTypes
 
 SHELL_SUFFIX = ".sh"
 
+# Only allow a single confirmation prompt at a time when several repositories are installed at once.
+prompt_lock = threading.Lock()
+
 
 class ShellInstaller(Installer):
     """A shell script specific installer."""
@@ -22,35 +26,49 @@ class ShellInstaller(Installer):
         # Initialize the repository.
         super().set_up()
 
-        logger.info(f"Running shell installer for repository {self.repository.url}")
-        self.evaluate_shell_scripts()
+        if self.is_installed():
+            logger.info(f"Repository {self.repository.url} is unchanged since it was last installed: skipping scripts")
+            return
 
-        # Clean up after installation.
-        super().clean_up()
+        logger.info(f"Running shell installer for repository {self.repository.url}")
+        if self.evaluate_shell_scripts():
+            self.record_installation()
+        else:
+            logger.warning(f"Not every script of repository {self.repository.url} ran: it will be installed again")
 
-    def evaluate_shell_scripts(self) -> None:
+    def evaluate_shell_scripts(self) -> bool:
         """
         Evaluate shell scripts within the working directory.
-        :return: None.
+        :return: Whether every script was executed successfully.
         """
+        all_succeeded = True
         for path in Path(self.working_directory).iterdir():
             if path.suffix == SHELL_SUFFIX:
                 if self.show_warning_messages:
-                    if click.confirm(f"Are you sure you want to execute '{path.name}'?"):
-                        self.execute_script(path)
+                    with prompt_lock:
+                        confirmed = click.confirm(f"Are you sure you want to execute '{path.name}'?")
+                    if confirmed:
+                        all_succeeded &= self.execute_script(path)
+                    else:
+                        all_succeeded = False
                 else:
-                    self.execute_script(path)
+                    all_succeeded &= self.execute_script(path)
 
-    @staticmethod
-    def execute_script(path: Path) -> None:
+        return all_succeeded
+
+    def execute_script(self, path: Path) -> bool:
         """
         Execute a shell script.
         :param path: The path to the shell script.
-        :return: None.
+        :return: Whether the script exited successfully.
         """
         try:
             logger.debug(f"Executing script '{path.name}'")
-            # This works because during the set-up process within Installer, we are dropped into the working directory.
-            subprocess.call(["sh", f"./{path.name}"])
+            # Scripts are run from within the working directory, as they expect to be.
+            return_code = subprocess.call(["sh", f"./{path.name}"], cwd=self.working_directory)
         except Exception as e:
             raise InstallerError(f"Could not execute shell script '{path.name}': {e}")
+
+        if return_code:
+            logger.warning(f"Shell script '{path.name}' exited with code {return_code}")
+        return not return_code
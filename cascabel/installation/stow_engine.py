@@ -0,0 +1,511 @@
+import os
+import re
+import stat
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Pattern
+
+LOCAL_IGNORE_FILE_NAME = ".stow-local-ignore"
+GLOBAL_IGNORE_FILE_NAME = ".stow-global-ignore"
+
+# The patterns ignored by GNU stow when a package has no ignore list of its own.
+DEFAULT_IGNORE_PATTERNS = [r"RCS", r".+,v", r"CVS", r"\.\#.+", r"\.cvsignore", r"\.svn", r"_darcs", r"\.hg", r"\.git",
+                           r"\.gitignore", r"\.gitmodules", r".+~", r"\#.*\#", r"^/README.*", r"^/LICENSE.*",
+                           r"^/COPYING"]
+
+# The kinds of node within the target directory.
+MISSING = "missing"
+LINK = "link"
+DIRECTORY = "directory"
+FILE = "file"
+
+
+class StowError(Exception):
+    """An error which occurred while planning or applying a stow."""
+    pass
+
+
+class IgnoreList:
+    """The patterns of the paths within a package which are never stowed, as understood by GNU stow."""
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        """
+        Initialize the ignore list.
+
+        Patterns including a slash are matched against the path within the
+        package (starting with a slash), and all others against the name.
+        :param patterns: The regular expressions to ignore.
+        """
+        patterns = list(patterns)
+        segment_patterns = [pattern for pattern in patterns if "/" not in pattern]
+        path_patterns = [pattern for pattern in patterns if "/" in pattern]
+        try:
+            self.segment_regexp: Optional[Pattern] = re.compile(
+                f"^(?:{'|'.join(segment_patterns)})$") if segment_patterns else None
+            self.path_regexp: Optional[Pattern] = re.compile(
+                f"(?:^|/)(?:{'|'.join(path_patterns)})(?:/|$)") if path_patterns else None
+        except re.error as e:
+            raise StowError(f"Invalid ignore pattern: {e}")
+
+    @staticmethod
+    def from_file(file_path: Path) -> "IgnoreList":
+        """
+        Read an ignore list, skipping any blank lines and comments.
+        :param file_path: The path of the ignore list.
+        :return: The ignore list.
+        """
+        patterns = []
+        for line in file_path.read_text().splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            # Strip any trailing comment, unless its hash is escaped.
+            line = re.sub(r"\s+#.*", "", re.sub(r"\s+\\#", "#", line))
+            patterns.append(line)
+
+        return IgnoreList(patterns)
+
+    def is_ignored(self, path: str, name: str) -> bool:
+        """
+        Check whether a path within a package is ignored.
+        :param path: The path within the package, starting with a slash.
+        :param name: The name of the path.
+        :return: Whether the path is ignored.
+        """
+        return bool(self.segment_regexp and self.segment_regexp.match(name) or
+                    self.path_regexp and self.path_regexp.search(path))
+
+
+def get_ignore_list(package_path: Path) -> IgnoreList:
+    """
+    Get the ignore list of a package: its own, or otherwise the global or default ignore list.
+    :param package_path: The path of the package.
+    :return: The ignore list.
+    """
+    local_path = package_path.joinpath(LOCAL_IGNORE_FILE_NAME)
+    global_path = Path.home().joinpath(GLOBAL_IGNORE_FILE_NAME)
+    if local_path.is_file():
+        return IgnoreList.from_file(local_path)
+    if global_path.is_file():
+        return IgnoreList.from_file(global_path)
+
+    return IgnoreList(DEFAULT_IGNORE_PATTERNS + [re.escape(LOCAL_IGNORE_FILE_NAME)])
+
+
+class StowEngine:
+    """
+    An in-process replacement for GNU stow.
+
+    Packages are planned against the target directory as it would be after
+    every operation planned before them, with each directory created by a
+    single package folded into a link to it, and unfolded again once another
+    package needs to share it. A package with any conflict is left out of the
+    plan entirely, so that the other packages can still be stowed.
+
+    Only the difference between the planned and the current target directory
+    is applied, so that restowing an unchanged package changes nothing.
+    """
+
+    def __init__(self, stow_directory: Path, target_directory: Optional[Path] = None) -> None:
+        """
+        Initialize the engine.
+        :param stow_directory: The directory containing the packages.
+        :param target_directory: The directory to link the packages into, by default the parent of the stow directory.
+        """
+        self.stow_directory = os.path.abspath(stow_directory)
+        self.target_directory = os.path.abspath(target_directory or os.path.dirname(self.stow_directory))
+
+        # The planned state of any changed paths within the target directory, layered over the file system.
+        self.overlay: dict[str, tuple[str, Optional[str]]] = {}
+        self.overlay_children: dict[str, set[str]] = {}
+
+        # The changes to the overlay made while planning the current package, so that they can be undone.
+        self.undo_log: list[tuple[str, Optional[tuple[str, Optional[str]]]]] = []
+        self.conflicts: list[str] = []
+
+        self.ignore_lists: dict[str, IgnoreList] = {}
+
+    def stow(self, package_names: Iterable[str], restow: bool = False) -> dict[str, list[str]]:
+        """
+        Plan stowing packages.
+        :param package_names: The names of the packages.
+        :param restow: Unstow each package before stowing it again, removing any links it no longer needs.
+        :return: The conflicts of each package which could not be planned.
+        """
+        return self.__plan(package_names, unstow=restow, stow=True)
+
+    def unstow(self, package_names: Iterable[str]) -> dict[str, list[str]]:
+        """
+        Plan unstowing packages.
+        :param package_names: The names of the packages.
+        :return: The conflicts of each package which could not be planned.
+        """
+        return self.__plan(package_names, unstow=True, stow=False)
+
+    def __plan(self, package_names: Iterable[str], unstow: bool, stow: bool) -> dict[str, list[str]]:
+        """
+        Plan unstowing and stowing packages, leaving out any package with a conflict.
+        :param package_names: The names of the packages.
+        :param unstow: Unstow the packages.
+        :param stow: Stow the packages.
+        :return: The conflicts of each package which could not be planned.
+        """
+        if not os.path.isdir(self.target_directory):
+            raise StowError(f"Target directory '{self.target_directory}' does not exist")
+
+        all_conflicts = {}
+        for package_name in package_names:
+            package_path = os.path.join(self.stow_directory, package_name)
+            if not os.path.isdir(package_path):
+                all_conflicts[package_name] = [f"package '{package_name}' does not exist"]
+                continue
+
+            self.undo_log = []
+            self.conflicts = []
+            if unstow:
+                self.__unstow_contents(package_name, package_path, self.target_directory, "")
+            if stow:
+                self.__stow_contents(package_name, package_path, self.target_directory, "")
+
+            if self.conflicts:
+                all_conflicts[package_name] = self.conflicts
+                undo_log, self.undo_log = self.undo_log, []
+                for path, previous_state in reversed(undo_log):
+                    self.__set_state(path, previous_state)
+
+        self.undo_log = []
+        return all_conflicts
+
+    def get_operations(self) -> list[tuple[str, str, Optional[str]]]:
+        """
+        Get the operations needed to turn the target directory into the planned one.
+
+        Everything to be removed is removed first (deepest first), and then
+        everything to be created is created (shallowest first).
+        :return: Each operation name, with the path within the target directory and any link destination.
+        """
+        real_states: dict[str, tuple[str, Optional[str]]] = {self.target_directory: (DIRECTORY, None)}
+        removals = []
+        creations = []
+        for path, (kind, link_destination) in self.overlay.items():
+            real_kind, real_link_destination = self.__get_real_state(path, real_states)
+            if (kind, link_destination) == (real_kind, real_link_destination):
+                continue
+
+            depth = path.count(os.sep)
+            if real_kind != MISSING:
+                removals.append((depth, path, "rmdir" if real_kind == DIRECTORY else "unlink"))
+            if kind != MISSING:
+                creations.append((depth, path, "mkdir" if kind == DIRECTORY else "link", link_destination))
+
+        return [(operation, path, None) for _, path, operation in sorted(removals, reverse=True)] + \
+               [(operation, path, link_destination) for _, path, operation, link_destination in sorted(creations)]
+
+    def __get_real_state(self, path: str, real_states: dict[str, tuple[str, Optional[str]]]) -> tuple[
+            str, Optional[str]]:
+        """
+        Get the current state of a path within the target directory, without following any links.
+        :param path: The path.
+        :param real_states: The states already found, by path.
+        :return: The kind of node, and the destination if it is a link.
+        """
+        if path not in real_states:
+            parent = os.path.dirname(path)
+            if self.__get_real_state(parent, real_states)[0] != DIRECTORY:
+                real_states[path] = MISSING, None
+            else:
+                try:
+                    status = os.lstat(path)
+                    if stat.S_ISLNK(status.st_mode):
+                        real_states[path] = LINK, os.readlink(path)
+                    else:
+                        real_states[path] = (DIRECTORY if stat.S_ISDIR(status.st_mode) else FILE), None
+                except (FileNotFoundError, NotADirectoryError):
+                    real_states[path] = MISSING, None
+
+        return real_states[path]
+
+    def apply(self) -> int:
+        """
+        Apply the planned operations to the target directory.
+        :return: The number of operations applied.
+        """
+        operations = self.get_operations()
+        for operation, path, link_destination in operations:
+            try:
+                if operation == "link" and link_destination is not None:
+                    os.symlink(link_destination, path)
+                elif operation == "unlink":
+                    os.unlink(path)
+                elif operation == "mkdir":
+                    os.mkdir(path)
+                elif operation == "rmdir":
+                    os.rmdir(path)
+            except OSError as e:
+                raise StowError(f"Could not {operation} '{path}': {e}")
+
+        self.overlay.clear()
+        self.overlay_children.clear()
+        return len(operations)
+
+    def __get_ignore_list(self, package_name: str) -> IgnoreList:
+        """
+        Get the ignore list of a package, reading it only once.
+        :param package_name: The name of the package.
+        :return: The ignore list.
+        """
+        if package_name not in self.ignore_lists:
+            self.ignore_lists[package_name] = get_ignore_list(Path(self.stow_directory, package_name))
+
+        return self.ignore_lists[package_name]
+
+    def __is_beneath_plan(self, directory: str) -> bool:
+        """
+        Check whether a directory within the target directory, or any directory above it, has a planned state.
+        :param directory: The directory.
+        :return: Whether the directory is beneath a planned change.
+        """
+        while len(directory) > len(self.target_directory):
+            if directory in self.overlay:
+                return True
+            directory = os.path.dirname(directory)
+
+        return False
+
+    def __get_state(self, path: str, is_beneath_plan: Optional[bool] = None) -> tuple[str, Optional[str]]:
+        """
+        Get the planned state of a path within the target directory.
+        :param path: The path.
+        :param is_beneath_plan: Whether the parent directory is beneath a planned change, if already known.
+        :return: The kind of node, and the destination if it is a link.
+        """
+        if path in self.overlay:
+            return self.overlay[path]
+
+        # Anything beneath a planned change only exists if planned itself, as the file system may still have a
+        # link to another package there.
+        if is_beneath_plan is None:
+            is_beneath_plan = self.__is_beneath_plan(os.path.dirname(path))
+        if is_beneath_plan:
+            return MISSING, None
+
+        try:
+            status = os.lstat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return MISSING, None
+
+        if stat.S_ISLNK(status.st_mode):
+            return LINK, os.readlink(path)
+        if stat.S_ISDIR(status.st_mode):
+            return DIRECTORY, None
+        return FILE, None
+
+    def __set_state(self, path: str, state: Optional[tuple[str, Optional[str]]]) -> None:
+        """
+        Set the planned state of a path within the target directory.
+        :param path: The path.
+        :param state: The kind of node and any link destination, or None to fall back to the file system.
+        :return: None.
+        """
+        self.undo_log.append((path, self.overlay.get(path)))
+        parent, name = os.path.split(path)
+        if state is None:
+            self.overlay.pop(path, None)
+            self.overlay_children.get(parent, set()).discard(name)
+        else:
+            self.overlay[path] = state
+            self.overlay_children.setdefault(parent, set()).add(name)
+
+    def __plan_operation(self, operation: str, path: str, link_destination: Optional[str] = None) -> None:
+        """
+        Plan an operation, updating the planned state of its path.
+        :param operation: The operation name.
+        :param path: The path within the target directory.
+        :param link_destination: The destination of any link.
+        :return: None.
+        """
+        self.__set_state(path, {"link": (LINK, link_destination), "mkdir": (DIRECTORY, None)}.get(operation,
+                                                                                                  (MISSING, None)))
+
+    def __list_directory(self, path: str) -> Iterator[str]:
+        """
+        List the planned entries of a directory within the target directory.
+        :param path: The directory.
+        :return: An iterator of the names of the entries which would exist.
+        """
+        names = set(self.overlay_children.get(path, ()))
+        if path not in self.overlay:
+            try:
+                names.update(os.listdir(path))
+            except OSError:
+                pass
+
+        return (name for name in names if self.__get_state(os.path.join(path, name))[0] != MISSING)
+
+    def __resolve_link(self, path: str, link_destination: str) -> str:
+        """
+        Resolve the absolute path a link points to, without following any further links.
+        :param path: The path of the link.
+        :param link_destination: The destination of the link.
+        :return: The absolute destination.
+        """
+        return os.path.normpath(os.path.join(os.path.dirname(path), link_destination))
+
+    def __get_owner(self, source_path: str) -> Optional[tuple[str, str]]:
+        """
+        Get the package owning a path within the stow directory.
+        :param source_path: The absolute path.
+        :return: The package name and the path within it (starting with a slash), or None if it is not within a
+        package.
+        """
+        relative_path = os.path.relpath(source_path, self.stow_directory)
+        if relative_path == "." or relative_path.startswith(".."):
+            return None
+
+        package_name, _, path = relative_path.partition(os.sep)
+        return package_name, f"/{path}"
+
+    def __iterate_package(self, package_name: str, source_directory: str, relative_path: str):
+        """
+        Iterate the entries of a directory within a package which are not ignored.
+        :param package_name: The name of the package.
+        :param source_directory: The directory within the package.
+        :param relative_path: The path of the directory within the package, without a trailing slash.
+        :return: An iterator of each entry, with its path within the package.
+        """
+        ignore_list = self.__get_ignore_list(package_name)
+        try:
+            with os.scandir(source_directory) as directory_entries:
+                entries = sorted(directory_entries, key=lambda e: e.name)
+        except OSError as e:
+            self.conflicts.append(f"cannot read '{source_directory}': {e}")
+            return
+
+        for entry in entries:
+            entry_path = f"{relative_path}/{entry.name}"
+            if not ignore_list.is_ignored(entry_path, entry.name):
+                yield entry, entry_path
+
+    def __stow_contents(self, package_name: str, source_directory: str, target_directory: str,
+                        relative_path: str) -> None:
+        """
+        Plan linking the contents of a directory within a package into a directory within the target.
+        :param package_name: The name of the package.
+        :param source_directory: The directory within the package.
+        :param target_directory: The matching directory within the target.
+        :param relative_path: The path of the directory within the package.
+        :return: None.
+        """
+        # Work out what is shared by every entry once for the whole directory.
+        is_beneath_plan = self.__is_beneath_plan(target_directory)
+        link_prefix = os.path.relpath(source_directory, target_directory)
+
+        for entry, entry_path in self.__iterate_package(package_name, source_directory, relative_path):
+            target_path = os.path.join(target_directory, entry.name)
+            if target_path == self.stow_directory:
+                continue
+            self.__stow_node(package_name, entry.path, target_path, f"{link_prefix}/{entry.name}", entry_path,
+                             entry.is_dir(follow_symlinks=False), is_beneath_plan)
+
+    def __stow_node(self, package_name: str, source_path: str, target_path: str, source_link_destination: str,
+                    relative_path: str, source_is_directory: bool, is_beneath_plan: bool) -> None:
+        """
+        Plan linking a single path within a package into the target.
+        :param package_name: The name of the package.
+        :param source_path: The path within the package.
+        :param target_path: The matching path within the target.
+        :param source_link_destination: The destination of a link from the target to the path within the package.
+        :param relative_path: The path within the package.
+        :param source_is_directory: Whether the path within the package is a directory.
+        :param is_beneath_plan: Whether the parent of the target is beneath a planned change.
+        :return: None.
+        """
+        kind, link_destination = self.__get_state(target_path, is_beneath_plan)
+        if kind == MISSING:
+            # Link the whole path, folding any directory into a single link.
+            self.__plan_operation("link", target_path, source_link_destination)
+
+        elif kind == LINK and link_destination is not None:
+            if link_destination == source_link_destination:
+                # Already stowed.
+                return
+
+            existing_source = self.__resolve_link(target_path, link_destination)
+            owner = self.__get_owner(existing_source)
+            if existing_source == source_path:
+                return
+
+            if not owner:
+                self.conflicts.append(f"existing target '{target_path}' is not owned by stow")
+            elif not os.path.exists(existing_source):
+                # Replace a link left behind by a package which no longer has the path.
+                self.__plan_operation("unlink", target_path)
+                self.__plan_operation("link", target_path, source_link_destination)
+            elif source_is_directory and os.path.isdir(existing_source):
+                # Unfold the directory shared with another package, linking the contents of both instead.
+                self.__plan_operation("unlink", target_path)
+                self.__plan_operation("mkdir", target_path)
+                self.__stow_contents(owner[0], existing_source, target_path, owner[1])
+                self.__stow_contents(package_name, source_path, target_path, relative_path)
+            else:
+                self.conflicts.append(f"existing target '{target_path}' is stowed from package '{owner[0]}'")
+
+        elif kind == DIRECTORY and source_is_directory:
+            self.__stow_contents(package_name, source_path, target_path, relative_path)
+
+        else:
+            self.conflicts.append(f"existing target '{target_path}' is neither a link nor a directory")
+
+    def __unstow_contents(self, package_name: str, source_directory: str, target_directory: str,
+                          relative_path: str) -> None:
+        """
+        Plan removing the links to the contents of a directory within a package.
+        :param package_name: The name of the package.
+        :param source_directory: The directory within the package.
+        :param target_directory: The matching directory within the target.
+        :param relative_path: The path of the directory within the package.
+        :return: None.
+        """
+        # Work out what is shared by every entry once for the whole directory.
+        is_beneath_plan = self.__is_beneath_plan(target_directory)
+        link_prefix = os.path.relpath(source_directory, target_directory)
+
+        for entry, entry_path in self.__iterate_package(package_name, source_directory, relative_path):
+            target_path = os.path.join(target_directory, entry.name)
+            kind, link_destination = self.__get_state(target_path, is_beneath_plan)
+            if kind == LINK and link_destination is not None:
+                if link_destination == f"{link_prefix}/{entry.name}" or \
+                        self.__resolve_link(target_path, link_destination) == entry.path:
+                    self.__plan_operation("unlink", target_path)
+            elif kind == DIRECTORY and entry.is_dir(follow_symlinks=False) and target_path != self.stow_directory:
+                self.__unstow_contents(package_name, entry.path, target_path, entry_path)
+                self.__fold(target_path)
+
+    def __fold(self, target_path: str) -> None:
+        """
+        Fold a directory within the target back into a single link, if everything left in it is from the same
+        directory of a single package.
+        :param target_path: The directory within the target.
+        :return: None.
+        """
+        # Stop at the first entry which cannot be folded, as most directories shared between packages have one.
+        names = []
+        parents = set()
+        for name in self.__list_directory(target_path):
+            path = os.path.join(target_path, name)
+            kind, link_destination = self.__get_state(path)
+            if kind != LINK or link_destination is None:
+                return
+            existing_source = self.__resolve_link(path, link_destination)
+            parents.add(os.path.dirname(existing_source))
+            if len(parents) > 1 or not self.__get_owner(existing_source):
+                return
+            names.append(name)
+
+        if not names:
+            return
+
+        for name in names:
+            self.__plan_operation("unlink", os.path.join(target_path, name))
+        self.__plan_operation("rmdir", target_path)
+        self.__plan_operation("link", target_path, os.path.relpath(parents.pop(), os.path.dirname(target_path)))
@@ -1,16 +1,64 @@
+import os
+import re
 import subprocess
 from pathlib import Path
+from typing import Iterable, Optional
 
+import git
 from loguru import logger
 
 from cascabel.installation.installer import Installer, InstallerError
+from cascabel.installation.stow_engine import StowEngine, StowError
+from cascabel.repository import Repository
 from cascabel.repository_types import RepositoryTypes
 
+# Stow packages by running GNU stow, or by planning and creating the links in-process.
+GNU_STOW_BACKEND = "gnu"
+NATIVE_STOW_BACKEND = "native"
+STOW_BACKENDS = [GNU_STOW_BACKEND, NATIVE_STOW_BACKEND]
+
+# The output of GNU stow introducing the conflicts of a package, each of which follows on its own line.
+STOW_CONFLICT_PATTERN = re.compile(r"^WARNING! (?:un)?stowing (.+) would cause conflicts:$")
+STOW_CONFLICT_DETAIL_PATTERN = re.compile(r"^\s+\*\s+(.+)$")
+
+# The output of GNU stow when a package does not exist.
+STOW_MISSING_PACKAGE_PATTERN = re.compile(r"does not contain package (\S+)")
+
+
+def get_target_directory(repository: Repository) -> Path:
+    """
+    Get the directory the packages of a repository are stowed into.
+
+    This is the configured target directory, or otherwise the parent of the
+    directory holding the packages, as with GNU stow by default.
+    :param repository: The repository.
+    :return: The target directory.
+    """
+    if repository.target_directory:
+        return Path(repository.target_directory).expanduser()
+
+    return Path(repository.execution_directory or repository.installation_directory).absolute().parent
+
 
 class StowInstaller(Installer):
     """A GNU stow specific installer."""
     installation_type = RepositoryTypes.STOW
 
+    def __init__(self, *args, backend: str = GNU_STOW_BACKEND, **kwargs):
+        """
+        Initialize the installer.
+        :param args: The arguments of any installer.
+        :param backend: The backend used to stow packages.
+        :param kwargs: The keyword arguments of any installer.
+        """
+        super().__init__(*args, **kwargs)
+
+        if backend not in STOW_BACKENDS:
+            raise InstallerError(f"Stow backend '{backend}' not found: expected one of {STOW_BACKENDS}")
+        self.backend = backend
+
+        self.target_directory = get_target_directory(self.repository)
+
     def install(self) -> None:
         """
         Install the repository.
@@ -19,22 +67,216 @@ class StowInstaller(Installer):
         # Initialize the repository.
         super().set_up()
 
+        if self.is_installed():
+            logger.info(f"Repository {self.repository.url} is unchanged since it was last installed: skipping stow")
+            return
+
         logger.info(f"Running stow installer for repository {self.repository.url}")
-        self.stow_directories()
+        changed_packages = self.get_changed_packages()
+        if changed_packages is None:
+            self.stow_directories(restow=True)
+        elif changed_packages:
+            self.stow_directories(changed_packages, restow=True)
+        else:
+            logger.debug("No packages changed since the last install: nothing to stow")
+        self.record_installation()
 
-        # Clean up after installation.
-        super().clean_up()
+    def get_installed_state(self) -> dict:
+        """
+        Get the state the repository would be recorded as installed from.
+        :return: The state of any installer, along with the target directory and backend the packages are stowed with.
+        """
+        return {**super().get_installed_state(), "target_directory": str(self.target_directory),
+                "backend": self.backend}
 
-    def stow_directories(self) -> None:
+    def get_changed_packages(self) -> Optional[list[str]]:
+        """
+        Find the packages changed since the commit the repository was last installed from.
+
+        Links to anything deleted since then are removed along the way, as
+        restowing a package never removes links to files it no longer has.
+        :return: The names of the changed packages which still exist, or None if every package needs to be stowed.
+        """
+        installed_state = self.ledger.get(self.repository.url) if self.ledger and not self.force else None
+        if not installed_state or installed_state.get("type") != self.repository.type.name:
+            return None
+
+        # Packages stowed elsewhere, or by another backend, have not been stowed here yet.
+        if installed_state.get("target_directory") != str(self.target_directory) or \
+                installed_state.get("backend") != self.backend:
+            logger.debug("Target directory or backend changed since the last install: stowing every package")
+            return None
+
+        installed_commit = installed_state.get("commit")
+        git_repository = self.git_repository
+        if not git_repository or not installed_commit or not Installer.has_commit(git_repository, installed_commit):
+            logger.debug("Last installed commit is unknown: stowing every package")
+            return None
+
+        if installed_commit == git_repository.head.commit.hexsha:
+            # The working directory itself has changed, which a diff between commits cannot account for.
+            logger.debug("Working directory changed since the last install: stowing every package")
+            return None
+
+        # List the changes within the working directory, with each path relative to it.
+        try:
+            diff = git.Git(self.working_directory).diff("--name-status", "-z", "--no-renames", "--relative",
+                                                         installed_commit, "HEAD")
+        except git.GitCommandError as e:
+            logger.warning(f"Unable to find changes since '{installed_commit}': {e}: stowing every package")
+            return None
+
+        fields = diff.split("\0")
+        changed_packages = set()
+        for status, path in zip(fields[0::2], fields[1::2]):
+            package, separator, _ = path.partition("/")
+
+            # Only directories are packages, and hidden ones are never stowed.
+            if not separator or package.startswith("."):
+                continue
+
+            changed_packages.add(package)
+            if status == "D":
+                self.remove_links(path)
+
+        logger.debug(f"Packages changed since '{installed_commit}': {sorted(changed_packages)}")
+        return sorted(package for package in changed_packages if
+                      Path(self.working_directory).joinpath(package).is_dir())
+
+    def remove_links(self, path: str) -> None:
+        """
+        Remove the link to a deleted file, or to the deleted directory it was folded into.
+        :param path: The path of the deleted file, relative to the working directory.
+        :return: None.
+        """
+        package, *parts = Path(path).parts
+        source_path = Path(self.working_directory).absolute().joinpath(package)
+        target_path = self.target_directory
+
+        # Follow the path within the target directory until reaching the link which provided it.
+        for part in parts:
+            source_path = source_path.joinpath(part)
+            target_path = target_path.joinpath(part)
+            if not target_path.is_symlink():
+                if not target_path.is_dir():
+                    return
+                continue
+
+            link_destination = os.path.normpath(target_path.parent.joinpath(os.readlink(target_path)))
+            if link_destination == str(source_path) and not source_path.exists():
+                logger.debug(f"Removing link '{target_path}' to deleted '{source_path}'")
+                target_path.unlink()
+            return
+
+    def stow_directories(self, package_names: Optional[Iterable[str]] = None, restow: bool = False) -> None:
         """
         Stow the directories.
+        :param package_names: The names of the directories to stow, by default every directory.
+        :param restow: Restow the directories, removing any links from before they changed.
+        :return: None.
+        """
+        if package_names is None:
+            # Ignore any hidden directories.
+            package_names = [path.name for path in Path(self.working_directory).iterdir() if
+                             path.is_dir() and path.name[0] != "."]
+
+        # A configured target directory may not have been made yet.
+        self.target_directory.mkdir(parents=True, exist_ok=True)
+
+        if self.backend == NATIVE_STOW_BACKEND:
+            self.stow_directories_natively(package_names, restow)
+            return
+
+        self.stow_directories_with_gnu_stow(list(package_names), restow)
+
+    def stow_directories_with_gnu_stow(self, package_names: list[str], restow: bool = False) -> None:
+        """
+        Stow the directories with a single invocation of GNU stow.
+
+        GNU stow stows nothing at all if any directory would conflict, so the
+        conflicting directories are left out and the rest are stowed again.
+        :param package_names: The names of the directories to stow.
+        :param restow: Restow the directories, removing any links from before they changed.
+        :return: None.
+        """
+        failed_directories: dict[str, list[str]] = {}
+        while package_names:
+            logger.debug(f"Stowing directories {package_names}")
+            arguments = ["stow", "--dir", str(Path(self.working_directory).absolute()), "--target",
+                         str(self.target_directory)] + (["--restow"] if restow else []) + package_names
+            try:
+                result = subprocess.run(arguments, capture_output=True, text=True)
+            except Exception as e:
+                raise InstallerError(f"Could not stow directories in '{self.repository.installation_directory}': {e}")
+
+            if not result.returncode:
+                break
+
+            errors = StowInstaller.parse_stow_errors(result.stderr, package_names)
+            failed_directories.update(errors)
+
+            # Errors naming none of the directories would otherwise have the same directories stowed again forever.
+            remaining_names = [package_name for package_name in package_names if package_name not in errors]
+            if len(remaining_names) == len(package_names):
+                break
+            package_names = remaining_names
+
+        # Carry on stowing the other directories, but do not consider the repository installed.
+        if failed_directories:
+            for package_name, package_errors in failed_directories.items():
+                for error in package_errors:
+                    logger.error(f"Cannot stow directory '{package_name}': {error}")
+            raise InstallerError(f"Could not stow directories {list(failed_directories)}")
+
+    @staticmethod
+    def parse_stow_errors(output: str, package_names: list[str]) -> dict[str, list[str]]:
+        """
+        Attribute the errors reported by GNU stow to the directories which caused them.
+        :param output: The error output of GNU stow.
+        :param package_names: The names of the directories which were stowed.
+        :return: The errors of each directory, with every directory failing if the errors cannot be attributed.
+        """
+        errors: dict[str, list[str]] = {}
+        package_name = None
+        for line in output.splitlines():
+            conflict_match = STOW_CONFLICT_PATTERN.match(line)
+            detail_match = STOW_CONFLICT_DETAIL_PATTERN.match(line)
+            missing_match = STOW_MISSING_PACKAGE_PATTERN.search(line)
+            if conflict_match:
+                package_name = conflict_match.group(1)
+                errors.setdefault(package_name, [])
+            elif detail_match and package_name:
+                errors[package_name].append(detail_match.group(1))
+            elif missing_match:
+                errors.setdefault(missing_match.group(1), []).append(line.strip())
+                package_name = None
+            else:
+                package_name = None
+
+        if not errors:
+            return {package_name: [output.strip() or "stow failed"] for package_name in package_names}
+
+        return errors
+
+    def stow_directories_natively(self, package_names: Iterable[str], restow: bool = False) -> None:
+        """
+        Stow the directories in-process, only creating or removing the links which need to change.
+        :param package_names: The names of the directories to stow.
+        :param restow: Restow the directories, removing any links from before they changed.
         :return: None.
         """
+        engine = StowEngine(Path(self.working_directory), self.target_directory)
         try:
-            for path in Path(self.working_directory).iterdir():
-                # Ignore any hidden directories.
-                if path.is_dir() and path.name[0] != ".":
-                    logger.debug(f"Stowing directory '{path.name}'")
-                    subprocess.run(["stow", path.name])
-        except Exception as e:
+            conflicts = engine.stow(package_names, restow=restow)
+            for package_name, package_conflicts in conflicts.items():
+                for conflict in package_conflicts:
+                    logger.error(f"Cannot stow directory '{package_name}': {conflict}")
+
+            # Carry on stowing the other directories, but do not consider the repository installed.
+            operation_count = engine.apply()
+        except StowError as e:
             raise InstallerError(f"Could not stow directories in '{self.repository.installation_directory}': {e}")
+
+        logger.debug(f"Applied {operation_count} link operations")
+        if conflicts:
+            raise InstallerError(f"Could not stow directories {list(conflicts)}")
@@ -1,10 +1,50 @@
-from dataclasses import dataclass
-from typing import Optional
+import sys
+from dataclasses import dataclass, fields
+from typing import Any, Iterable, Iterator, Mapping, Optional
 
 from cascabel.repository_types import RepositoryTypes
 
+# Look up repository types directly, rather than through the enum's name resolution.
+REPOSITORY_TYPES_BY_NAME: dict[str, RepositoryTypes] = dict(RepositoryTypes.__members__)
 
-@dataclass
+
+def slotted(cls: type) -> type:
+    """
+    Recreate a dataclass with slots for each of its fields, as "dataclass(slots=True)" does from Python 3.10.
+    :param cls: The dataclass.
+    :return: The dataclass with slots, and without a per-instance dictionary.
+    """
+    field_names = tuple(field.name for field in fields(cls))
+    namespace = {key: value for key, value in cls.__dict__.items() if
+                 key not in field_names and key not in ("__dict__", "__weakref__")}
+    namespace["__slots__"] = field_names
+
+    # Without a dictionary, copying and pickling need the state of each slot, which a frozen dataclass can only restore
+    # by bypassing its own "__setattr__".
+    def __getstate__(self) -> list[Any]:
+        return [getattr(self, name) for name in field_names]
+
+    def __setstate__(self, state: list[Any]) -> None:
+        for name, value in zip(field_names, state):
+            object.__setattr__(self, name, value)
+
+    namespace["__getstate__"] = __getstate__
+    namespace["__setstate__"] = __setstate__
+
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+def intern_optional(value: Optional[str]) -> Optional[str]:
+    """
+    Intern an optional string.
+    :param value: The string, or None.
+    :return: The interned string, or None.
+    """
+    return sys.intern(value) if value else value
+
+
+@slotted
+@dataclass(frozen=True)
 class Repository:
     """An abstract configuration repository."""
     url: str
@@ -15,10 +55,119 @@ class Repository:
     execution_directory: Optional[str]
     order_place: int = -1
     lock_hash: bool = False
+    depends_on: tuple[str, ...] = ()
+    tags: tuple[str, ...] = ()
+    target_directory: Optional[str] = None
+
+    @staticmethod
+    def from_mapping(repository_url: str, repository_info: Mapping[str, Any]) -> "Repository":
+        """
+        Create a repository from its configuration, without changing the configuration.
+
+        Strings which are commonly repeated between repositories (such as URLs
+        referred to by dependencies, branches and tags) are interned, so that
+        large configurations only hold a single copy of each.
+        :param repository_url: The repository URL.
+        :param repository_info: The configuration of the repository.
+        :return: The repository.
+        """
+        return Repository(sys.intern(repository_url),
+                          REPOSITORY_TYPES_BY_NAME[repository_info["type"]],
+                          sys.intern(repository_info["installation_directory"]),
+                          intern_optional(repository_info.get("branch")),
+                          repository_info.get("current_hash"),
+                          intern_optional(repository_info.get("execution_directory")),
+                          repository_info.get("order_place", -1),
+                          repository_info.get("lock_hash", False),
+                          tuple(sys.intern(url) for url in repository_info.get("depends_on") or ()),
+                          tuple(sys.intern(tag) for tag in repository_info.get("tags") or ()),
+                          intern_optional(repository_info.get("target_directory")))
 
     @staticmethod
     def repository_dictionary_to_repository(repository_url, repository_info: dict):
-        # Overwrite the string representation of the type as the proper enum type.
-        repository_info["type"] = RepositoryTypes[repository_info["type"]]
+        return Repository.from_mapping(repository_url, repository_info)
+
+
+class RepositoryRegistry:
+    """
+    An index of the configured repositories.
+
+    The configuration is parsed once into repositories, which are indexed so
+    that selecting, excluding and ordering them never needs to scan the raw
+    configuration again.
+    """
+
+    def __init__(self, repositories: Iterable[Repository]) -> None:
+        """
+        Initialize the registry.
+        :param repositories: The repositories to index.
+        """
+        self.by_url: dict[str, Repository] = {}
+        self.by_type: dict[RepositoryTypes, set[str]] = {}
+        self.by_order_place: dict[int, list[str]] = {}
+        self.by_installation_directory: dict[str, list[str]] = {}
+        self.by_tag: dict[str, set[str]] = {}
+
+        for repository in repositories:
+            self.by_url[repository.url] = repository
+            self.by_type.setdefault(repository.type, set()).add(repository.url)
+            self.by_order_place.setdefault(repository.order_place, []).append(repository.url)
+            self.by_installation_directory.setdefault(repository.installation_directory, []).append(repository.url)
+            for tag in repository.tags:
+                self.by_tag.setdefault(tag, set()).add(repository.url)
+
+        self.order_places = sorted(self.by_order_place)
+
+    @staticmethod
+    def from_configuration(configuration_contents: dict) -> "RepositoryRegistry":
+        """
+        Create a registry from the configuration contents.
+        :param configuration_contents: The configuration as a dictionary.
+        :return: The registry of the configured repositories.
+        """
+        return RepositoryRegistry(Repository.from_mapping(url, repository_info) for
+                                  url, repository_info in configuration_contents.items())
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.by_url
+
+    def __len__(self) -> int:
+        return len(self.by_url)
+
+    def __iter__(self) -> Iterator[Repository]:
+        """
+        Iterate over the repositories, in order of their order place.
+        :return: An iterator of the repositories.
+        """
+        for order_place in self.order_places:
+            for url in self.by_order_place[order_place]:
+                yield self.by_url[url]
+
+    def get(self, url: str) -> Optional[Repository]:
+        """
+        Get a repository by its URL.
+        :param url: The repository URL.
+        :return: The repository, or None if it is not configured.
+        """
+        return self.by_url.get(url)
+
+    def select(self, exclude_urls: Iterable[str] = (), exclude_types: Iterable[RepositoryTypes] = (),
+               tags: Iterable[str] = ()) -> list[Repository]:
+        """
+        Select repositories, in order of their order place.
+        :param exclude_urls: The URLs of any repositories to exclude.
+        :param exclude_types: The types of any repositories to exclude.
+        :param tags: Only select repositories with any of these tags, or every repository if there are none.
+        :return: The selected repositories.
+        """
+        tags = list(tags)
+        if tags:
+            selected_urls = set().union(*(self.by_tag.get(tag, set()) for tag in tags))
+        else:
+            selected_urls = set(self.by_url)
+
+        selected_urls.difference_update(exclude_urls)
+        for repository_type in exclude_types:
+            selected_urls.difference_update(self.by_type.get(repository_type, set()))
 
-        return Repository(repository_url, **repository_info)
+        return [repository for repository in self if repository.url in selected_urls]
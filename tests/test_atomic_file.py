@@ -0,0 +1,21 @@
+import stat
+from pathlib import Path
+
+from cascabel.configuration.atomic_file import write_atomically
+
+
+def test_write_atomically_keeps_the_permissions_of_the_file(tmp_path: Path):
+    file_path = tmp_path.joinpath("repositories.yml")
+    file_path.write_text("old")
+    file_path.chmod(0o644)
+
+    status = write_atomically(file_path, b"new")
+    assert file_path.read_text() == "new"
+    assert stat.S_IMODE(file_path.stat().st_mode) == 0o644
+    assert (status.st_ino, status.st_size) == (file_path.stat().st_ino, 3)
+    assert [path.name for path in tmp_path.iterdir()] == ["repositories.yml"]
+
+    # A new file is only accessible by its owner.
+    new_file_path = tmp_path.joinpath("install-ledger.json")
+    write_atomically(new_file_path, b"{}")
+    assert stat.S_IMODE(new_file_path.stat().st_mode) == 0o600
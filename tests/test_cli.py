@@ -0,0 +1,16 @@
+from pathlib import Path
+
+import pytest
+
+import cascabel.configuration
+from cascabel.cli import COMPLETION_LIMIT, complete_repository_url
+from cascabel.configuration.completion_index import CompletionIndex
+
+
+def test_complete_repository_url_is_filtered_and_limited(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cascabel.configuration, "DEFAULT_CONFIG_PATH", tmp_path, raising=False)
+    CompletionIndex(tmp_path).write([f"https://example.com/{index}.git" for index in range(COMPLETION_LIMIT * 2)] +
+                                   ["git@example.com:dotfiles.git"])
+
+    assert complete_repository_url(None, None, "git@") == ["git@example.com:dotfiles.git"]
+    assert len(complete_repository_url(None, None, "")) == COMPLETION_LIMIT
@@ -0,0 +1,132 @@
+import stat
+from pathlib import Path
+
+import yaml
+
+from cascabel.configuration.completion_index import COMPLETION_INDEX_FILE_NAME, CompletionIndex
+from cascabel.configuration.configuration_manager import CONFIG_CACHE_FILE_NAME, CONFIG_FILE_NAME, \
+    CONFIG_LOCK_FILE_NAME, ConfigurationManager, YamlDumper
+from cascabel.repository import Repository
+from cascabel.repository_types import RepositoryTypes
+
+
+def make_repository(url: str, current_hash: str = None) -> Repository:
+    return Repository(url=url, type=RepositoryTypes.STOW, installation_directory=f"/tmp/{url}", branch=None,
+                      current_hash=current_hash, execution_directory=None)
+
+
+def read_file(directory_path: Path) -> dict:
+    return yaml.safe_load(directory_path.joinpath(CONFIG_FILE_NAME).read_text()) or {}
+
+
+def test_write_repository_round_trip(tmp_path: Path):
+    manager = ConfigurationManager(tmp_path)
+    manager.write_repository(make_repository("dotfiles", "abc"))
+    manager.write_configuration()
+
+    contents = ConfigurationManager(tmp_path).configuration_contents
+    assert contents["dotfiles"]["current_hash"] == "abc"
+    assert contents["dotfiles"]["type"] == "STOW"
+
+
+def test_write_keeps_the_permissions_of_the_configuration_file(tmp_path: Path):
+    tmp_path.joinpath(CONFIG_FILE_NAME).touch()
+    tmp_path.joinpath(CONFIG_FILE_NAME).chmod(0o644)
+    manager = ConfigurationManager(tmp_path)
+    manager.write_repository(make_repository("dotfiles"))
+    manager.write_configuration()
+
+    assert stat.S_IMODE(tmp_path.joinpath(CONFIG_FILE_NAME).stat().st_mode) == 0o644
+
+
+def test_deferred_writes_are_written_once_at_the_end(tmp_path: Path):
+    manager = ConfigurationManager(tmp_path)
+    with manager.deferred_writes():
+        for index in range(3):
+            manager.write_repository(make_repository(f"repository-{index}", str(index)))
+            manager.write_configuration()
+            assert read_file(tmp_path) == {}
+
+    assert sorted(read_file(tmp_path)) == ["repository-0", "repository-1", "repository-2"]
+
+
+def test_concurrent_writers_merge_their_changes(tmp_path: Path):
+    first_manager = ConfigurationManager(tmp_path)
+    second_manager = ConfigurationManager(tmp_path)
+
+    first_manager.write_repository(make_repository("dotfiles", "abc"))
+    first_manager.write_configuration()
+    second_manager.write_repository(make_repository("packages", "def"))
+    second_manager.write_configuration()
+
+    assert sorted(read_file(tmp_path)) == ["dotfiles", "packages"]
+
+    first_manager.remove_repository_by_url("dotfiles")
+    first_manager.write_configuration()
+    assert sorted(read_file(tmp_path)) == ["packages"]
+    assert sorted(tmp_path.iterdir()) == sorted(tmp_path.joinpath(name) for name in
+                                                 [CONFIG_FILE_NAME, CONFIG_LOCK_FILE_NAME, CONFIG_CACHE_FILE_NAME,
+                                                  COMPLETION_INDEX_FILE_NAME])
+    assert CompletionIndex(tmp_path).read() == ["packages"]
+
+
+def test_cache_is_rebuilt_when_the_file_changes(tmp_path: Path):
+    manager = ConfigurationManager(tmp_path)
+    manager.write_repository(make_repository("dotfiles", "abc"))
+    manager.write_configuration()
+    assert tmp_path.joinpath(CONFIG_CACHE_FILE_NAME).exists()
+
+    # Edit the file by hand, keeping the same size.
+    configuration_path = tmp_path.joinpath(CONFIG_FILE_NAME)
+    configuration_path.write_text(configuration_path.read_text().replace("abc", "xyz"))
+
+    assert ConfigurationManager(tmp_path).configuration_contents["dotfiles"]["current_hash"] == "xyz"
+
+
+def test_written_configuration_matches_pure_python_dumper(tmp_path: Path):
+    manager = ConfigurationManager(tmp_path)
+    manager.write_repository(make_repository("git@github.com:user/dotfiles.git", "abc"))
+    manager.write_repository(make_repository("/home/user/a path: with 'quotes'"))
+    manager.write_configuration()
+
+    assert tmp_path.joinpath(CONFIG_FILE_NAME).read_text() == yaml.safe_dump(manager.configuration_contents)
+    assert yaml.dump(manager.configuration_contents, Dumper=YamlDumper) == yaml.safe_dump(
+        manager.configuration_contents)
+
+
+def test_sqlite_backend_round_trip_and_export(tmp_path: Path):
+    from cascabel.configuration.sqlite_configuration_manager import SqliteConfigurationManager
+
+    yaml_manager = ConfigurationManager(tmp_path)
+    yaml_manager.write_repository(make_repository("dotfiles", "abc"))
+    yaml_manager.write_configuration()
+
+    # A new database is filled from the YAML configuration.
+    manager = SqliteConfigurationManager(tmp_path)
+    assert manager.configuration_contents == read_file(tmp_path)
+
+    with manager.deferred_writes():
+        manager.write_repository(make_repository("packages", "def"))
+        manager.write_configuration()
+        manager.remove_repository_by_url("dotfiles")
+
+    assert SqliteConfigurationManager(tmp_path).configuration_contents == manager.configuration_contents
+    assert CompletionIndex(tmp_path).read() == ["packages"]
+
+    manager.export_configuration()
+    assert read_file(tmp_path) == manager.configuration_contents
+
+
+def test_sqlite_backend_is_only_filled_from_yaml_once(tmp_path: Path):
+    from cascabel.configuration.sqlite_configuration_manager import SqliteConfigurationManager
+
+    yaml_manager = ConfigurationManager(tmp_path)
+    yaml_manager.write_repository(make_repository("dotfiles", "abc"))
+    yaml_manager.write_configuration()
+
+    manager = SqliteConfigurationManager(tmp_path)
+    manager.remove_repository_by_url("dotfiles")
+    manager.write_configuration()
+
+    # An emptied database stays empty, even though the YAML configuration still has the repository.
+    assert SqliteConfigurationManager(tmp_path).configuration_contents == {}
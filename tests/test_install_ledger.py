@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from cascabel.configuration.install_ledger import LEDGER_FILE_NAME, InstallLedger, fingerprint_directory
+
+
+def test_ledger_round_trip(tmp_path: Path):
+    ledger = InstallLedger(tmp_path)
+    state = {"commit": "abc", "type": "STOW", "fingerprint": fingerprint_directory(tmp_path)}
+    assert not ledger.is_unchanged("dotfiles", state)
+
+    ledger.record("dotfiles", state)
+    ledger.write()
+
+    assert InstallLedger(tmp_path).is_unchanged("dotfiles", state)
+    assert not InstallLedger(tmp_path).is_unchanged("dotfiles", {**state, "commit": "def"})
+
+
+def test_fingerprint_changes_with_the_top_level_only(tmp_path: Path):
+    tmp_path.joinpath("bash").mkdir()
+    tmp_path.joinpath(".git").mkdir()
+    fingerprint = fingerprint_directory(tmp_path)
+
+    # Changes within git itself are ignored.
+    tmp_path.joinpath(".git", "FETCH_HEAD").touch()
+    assert fingerprint_directory(tmp_path) == fingerprint
+
+    tmp_path.joinpath("install.sh").touch()
+    assert fingerprint_directory(tmp_path) != fingerprint
+
+
+def test_concurrent_writers_never_share_a_temporary_file(tmp_path: Path):
+    # Each ledger stands for a separate process, so only the file system keeps the writes apart.
+    def write(index: int) -> None:
+        for iteration in range(20):
+            ledger = InstallLedger(tmp_path)
+            ledger.record(f"repository-{index}", {"commit": str(iteration)})
+            ledger.write()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(write, range(8)))
+
+    assert InstallLedger(tmp_path).entries
+    assert [path.name for path in tmp_path.iterdir()] == [LEDGER_FILE_NAME]
@@ -0,0 +1,51 @@
+import subprocess
+from dataclasses import replace
+from pathlib import Path
+
+from cascabel.configuration.configuration_manager import ConfigurationManager
+from cascabel.installation.installer import Installer
+from cascabel.repository import Repository
+from cascabel.repository_types import RepositoryTypes
+
+
+def run_git(directory_path: Path, *arguments: str) -> str:
+    return subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *arguments],
+                          cwd=directory_path, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit_to_remote(tmp_path: Path, remote_path: Path, message: str) -> str:
+    work_path = tmp_path.joinpath("work")
+    if not work_path.exists():
+        run_git(tmp_path, "clone", "-q", str(remote_path), str(work_path))
+    work_path.joinpath("file.txt").write_text(message)
+    run_git(work_path, "add", "file.txt")
+    run_git(work_path, "commit", "-q", "-m", message)
+    run_git(work_path, "push", "-q", "origin", "HEAD:main")
+    return run_git(work_path, "rev-parse", "HEAD")
+
+
+def test_install_after_locked_install_returns_to_the_default_branch(tmp_path: Path):
+    remote_path = tmp_path.joinpath("remote.git")
+    run_git(tmp_path, "init", "-q", "--bare", "--initial-branch=main", str(remote_path))
+    first_hash = commit_to_remote(tmp_path, remote_path, "first")
+
+    installation_path = tmp_path.joinpath("clone")
+    repository = Repository(url=str(remote_path), type=RepositoryTypes.NONE,
+                            installation_directory=str(installation_path), branch=None, current_hash=None,
+                            execution_directory=None)
+    manager = ConfigurationManager(tmp_path.joinpath("configuration"))
+
+    # Update resolves the latest commit, which a locked install checks out with a detached HEAD.
+    locked_hash = Installer.resolve_remote_commit(repository.url)
+    assert locked_hash == first_hash
+    Installer(replace(repository, lock_hash=True, current_hash=locked_hash), manager).set_up()
+    assert run_git(installation_path, "rev-parse", "HEAD") == first_hash
+    assert run_git(installation_path, "rev-parse", "--abbrev-ref", "HEAD") == "HEAD"
+
+    # A plain install then switches back to the default branch, and fast-forwards it to the latest commit.
+    second_hash = commit_to_remote(tmp_path, remote_path, "second")
+    installer = Installer(repository, manager)
+    installer.set_up()
+    assert run_git(installation_path, "rev-parse", "--abbrev-ref", "HEAD") == "main"
+    assert run_git(installation_path, "rev-parse", "HEAD") == second_hash
+    assert installer.repository.current_hash == second_hash
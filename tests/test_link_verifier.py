@@ -0,0 +1,40 @@
+import os
+from pathlib import Path
+
+from cascabel.configuration.link_index import LinkIndex
+from cascabel.installation.link_verifier import BROKEN, HIJACKED, MISSING, LinkVerifier
+from cascabel.installation.stow_engine import StowEngine
+from cascabel.repository import Repository
+from cascabel.repository_types import RepositoryTypes
+
+
+def test_verify_reports_drifted_links(tmp_path: Path):
+    stow_path = tmp_path.joinpath("packages")
+    for path in ["vim/.vimrc", "vim/.config/vim/vimrc", "git/.config/git/config", "git/.gitconfig"]:
+        stow_path.joinpath(path).parent.mkdir(parents=True, exist_ok=True)
+        stow_path.joinpath(path).touch()
+    engine = StowEngine(stow_path)
+    engine.stow(["vim", "git"])
+    engine.apply()
+
+    repository = Repository(url="https://example.com/dots.git", type=RepositoryTypes.STOW,
+                            installation_directory=str(stow_path), branch=None, current_hash=None,
+                            execution_directory=None)
+    verifier = LinkVerifier(LinkIndex(tmp_path))
+    assert verifier.verify([repository]) == {}
+    assert tmp_path.joinpath(".link-index").exists()
+
+    # Drift within an unfolded directory and at the top of the target is found from the index.
+    tmp_path.joinpath(".gitconfig").unlink()
+    tmp_path.joinpath(".config", "vim").unlink()
+    tmp_path.joinpath(".config", "vim").symlink_to(tmp_path)
+    stow_path.joinpath("vim", ".vimrc").unlink()
+    problems = verifier.verify([repository])[repository.url]
+    assert sorted(problems) == [
+        (BROKEN, str(tmp_path.joinpath(".vimrc")), str(stow_path.joinpath("vim", ".vimrc"))),
+        (HIJACKED, str(tmp_path.joinpath(".config", "vim")), str(stow_path.joinpath("vim", ".config", "vim"))),
+        (MISSING, str(tmp_path.joinpath(".gitconfig")), str(stow_path.joinpath("git", ".gitconfig")))]
+
+    # Repaired links are no longer reported.
+    tmp_path.joinpath(".gitconfig").symlink_to(os.path.join("packages", "git", ".gitconfig"))
+    assert sorted(problem[0] for problem in verifier.verify([repository])[repository.url]) == [BROKEN, HIJACKED]
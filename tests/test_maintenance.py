@@ -0,0 +1,52 @@
+import subprocess
+from pathlib import Path
+
+from cascabel.configuration.maintenance_log import MaintenanceLog
+from cascabel.installation import maintenance
+from cascabel.installation.installer import FAST_STATUS_SETTINGS
+from cascabel.installation.maintenance import maintain_repositories
+from cascabel.repository import Repository
+from cascabel.repository_types import RepositoryTypes
+
+
+def make_repository(repository_path: Path) -> Repository:
+    return Repository(url=f"https://example.com/{repository_path.name}.git", type=RepositoryTypes.NONE,
+                      installation_directory=str(repository_path), branch=None, current_hash=None,
+                      execution_directory=None)
+
+
+def get_setting(repository_path: Path, key: str) -> str:
+    return subprocess.run(["git", "config", "--local", key], cwd=repository_path, capture_output=True,
+                          text=True).stdout.strip()
+
+
+def test_maintain_repositories_configures_fast_status(tmp_path: Path):
+    repository_path = tmp_path.joinpath("repository")
+    subprocess.run(["git", "init", "-q", str(repository_path)], check=True)
+
+    # Repositories which are not cloned yet are skipped without failing.
+    repositories = [make_repository(repository_path), make_repository(tmp_path.joinpath("missing"))]
+    assert maintain_repositories(repositories, jobs=2) == []
+    for key, value in FAST_STATUS_SETTINGS.items():
+        assert get_setting(repository_path, key) == value
+
+
+def test_maintenance_tasks_are_not_repeated_within_the_interval(tmp_path: Path, monkeypatch):
+    repository_path = tmp_path.joinpath("repository")
+    subprocess.run(["git", "init", "-q", str(repository_path)], check=True)
+    repository = make_repository(repository_path)
+
+    log = MaintenanceLog(tmp_path)
+    assert maintain_repositories([repository], log=log, configure=False) == []
+    log.write()
+    assert repository.url in MaintenanceLog(tmp_path).read()
+
+    # The tasks run again only once the interval has passed, or when forced, and until then no git command is run.
+    runs = []
+    monkeypatch.setattr(maintenance, "run_maintenance_tasks", runs.append)
+    monkeypatch.setattr(maintenance.Installer, "configure_fast_status", runs.append)
+    assert maintain_repositories([repository], log=log) == []
+    assert runs == []
+    assert maintain_repositories([repository], log=log, interval=0, configure=False) == []
+    assert maintain_repositories([repository], log=log, force=True, configure=False) == []
+    assert runs == [repository_path, repository_path]
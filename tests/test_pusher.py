@@ -0,0 +1,92 @@
+import subprocess
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from cascabel.installation.installer import Installer
+from cascabel.installation import pusher
+from cascabel.installation.pusher import COMMIT_FAILED, PUSH_FAILED, PUSHED, UNCHANGED, get_remote_host, \
+    push_repositories
+
+
+def run_git(directory_path: Path, *arguments: str) -> str:
+    return subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *arguments],
+                          cwd=directory_path, check=True, capture_output=True, text=True).stdout
+
+
+def make_clone(tmp_path: Path, name: str) -> Path:
+    remote_path = tmp_path.joinpath(f"{name}.git")
+    clone_path = tmp_path.joinpath(name)
+    run_git(tmp_path, "init", "-q", "--bare", str(remote_path))
+    run_git(tmp_path, "clone", "-q", str(remote_path), str(clone_path))
+    clone_path.joinpath("README.md").write_text("readme")
+    run_git(clone_path, "add", "README.md")
+    run_git(clone_path, "commit", "-q", "-m", "Initial commit")
+    run_git(clone_path, "push", "-q", "origin", "HEAD")
+    return clone_path
+
+
+def test_parse_status_finds_every_kind_of_change():
+    output = "\0".join(["1 .M N... 100644 100644 100644 abc abc some file.txt",
+                        "2 R. N... 100644 100644 100644 abc abc R100 new name.txt", "old name.txt",
+                        "u UU N... 100644 100644 100644 100644 abc abc abc conflict.txt", "? untracked/", ""])
+    assert Installer.parse_status(output)["paths"] == ["some file.txt", "new name.txt", "conflict.txt", "untracked/"]
+
+    output = "\0".join(["# branch.oid abc", "# branch.head main", "# branch.upstream origin/main",
+                        "# branch.ab +2 -1", ""])
+    assert Installer.parse_status(output) == {"paths": [], "head": "main", "upstream": "origin/main", "ahead": 2,
+                                              "behind": 1}
+
+
+def test_push_repositories_pushes_only_changed_repositories(tmp_path: Path, monkeypatch):
+    for variable in ["GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME", "GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"]:
+        monkeypatch.setenv(variable, "test@example.com" if variable.endswith("EMAIL") else "test")
+    clean_path = make_clone(tmp_path, "clean")
+    changed_path = make_clone(tmp_path, "changed")
+    changed_path.joinpath("README.md").write_text("changed")
+    unreachable_path = make_clone(tmp_path, "unreachable")
+    unreachable_path.joinpath("README.md").write_text("changed")
+    run_git(unreachable_path, "remote", "set-url", "origin", str(tmp_path.joinpath("gone.git")))
+
+    # Commits which have not been pushed yet are pushed even without any changes to commit.
+    ahead_path = make_clone(tmp_path, "ahead")
+    run_git(ahead_path, "commit", "-q", "--allow-empty", "-m", "Unpushed")
+
+    # A failed push keeps its commit locally, without affecting any other repository.
+    missing_path = tmp_path.joinpath("missing")
+    assert push_repositories([clean_path, changed_path, ahead_path, unreachable_path, missing_path], "Update",
+                             jobs=3) == {clean_path: UNCHANGED, changed_path: PUSHED, ahead_path: PUSHED,
+                                         unreachable_path: PUSH_FAILED, missing_path: COMMIT_FAILED}
+    assert run_git(tmp_path.joinpath("ahead.git"), "log", "-1", "--format=%s").strip() == "Unpushed"
+    assert run_git(unreachable_path, "log", "-1", "--format=%s").strip() == "Update"
+    assert run_git(tmp_path.joinpath("changed.git"), "log", "-1", "--format=%s").strip() == "Update"
+    assert run_git(tmp_path.joinpath("clean.git"), "log", "-1", "--format=%s").strip() == "Initial commit"
+
+
+def test_get_remote_host():
+    assert get_remote_host("https://github.com/user/repository.git") == "github.com"
+    assert get_remote_host("ssh://git@example.com:2222/repository.git") == "example.com"
+    assert get_remote_host("git@github.com:user/repository.git") == "github.com"
+    assert get_remote_host("/srv/git/repository.git") == ""
+
+
+def test_push_by_host_limits_pushes_to_each_host(monkeypatch):
+    lock = threading.Lock()
+    running: Counter = Counter()
+    most_running: Counter = Counter()
+
+    def push_repository(repository_path: Path) -> str:
+        with lock:
+            running[repository_path.parent] += 1
+            most_running[repository_path.parent] = max(most_running[repository_path.parent],
+                                                       running[repository_path.parent])
+        time.sleep(0.02)
+        with lock:
+            running[repository_path.parent] -= 1
+        return PUSHED
+
+    monkeypatch.setattr(pusher, "push_repository", push_repository)
+    hosts = {Path(host, str(index)): host for host in ["a", "b"] for index in range(4)}
+    assert pusher.push_by_host(hosts, jobs=4, host_jobs=2) == {path: PUSHED for path in hosts}
+    assert most_running == {Path("a"): 2, Path("b"): 2}
@@ -0,0 +1,53 @@
+import copy
+import pickle
+
+from cascabel.repository import Repository, RepositoryRegistry
+from cascabel.repository_types import RepositoryTypes
+
+CONFIGURATION = {
+    "dotfiles": {"type": "STOW", "installation_directory": "/home/user/dotfiles", "order_place": 2, "branch": None,
+                 "current_hash": None, "lock_hash": False, "execution_directory": None, "depends_on": ["packages"],
+                 "tags": ["desktop"]},
+    "packages": {"type": "SHELL", "installation_directory": "/home/user/packages", "order_place": 1, "branch": None,
+                 "current_hash": None, "lock_hash": False, "execution_directory": None},
+    "scripts": {"type": "SHELL", "installation_directory": "/home/user/scripts", "order_place": 3, "branch": None,
+                "current_hash": None, "lock_hash": False, "execution_directory": None, "tags": ["desktop", "work"]},
+}
+
+
+def test_configuration_is_not_mutated():
+    registry = RepositoryRegistry.from_configuration(CONFIGURATION)
+
+    assert CONFIGURATION["dotfiles"]["type"] == "STOW"
+    assert registry.get("dotfiles").type is RepositoryTypes.STOW
+    assert registry.get("dotfiles").depends_on == ("packages",)
+    assert registry.get("packages").tags == ()
+
+
+def test_select_orders_by_order_place():
+    registry = RepositoryRegistry.from_configuration(CONFIGURATION)
+
+    assert [r.url for r in registry.select()] == ["packages", "dotfiles", "scripts"]
+    assert [r.url for r in registry.select(exclude_urls=["packages"])] == ["dotfiles", "scripts"]
+    assert [r.url for r in registry.select(exclude_types=[RepositoryTypes.SHELL])] == ["dotfiles"]
+    assert [r.url for r in registry.select(tags=["work", "missing"])] == ["scripts"]
+    assert [r.url for r in registry.select(exclude_types=[RepositoryTypes.STOW], tags=["desktop"])] == ["scripts"]
+
+
+def test_registry_indexes():
+    registry = RepositoryRegistry(
+        [Repository.repository_dictionary_to_repository(url, info) for url, info in CONFIGURATION.items()])
+
+    assert len(registry) == 3
+    assert "scripts" in registry and "missing" not in registry
+    assert registry.by_type[RepositoryTypes.SHELL] == {"packages", "scripts"}
+    assert registry.by_installation_directory["/home/user/dotfiles"] == ["dotfiles"]
+    assert registry.by_tag["desktop"] == {"dotfiles", "scripts"}
+
+
+def test_repository_can_be_copied_and_pickled():
+    repository = RepositoryRegistry.from_configuration(CONFIGURATION).get("dotfiles")
+
+    for duplicate in [copy.copy(repository), copy.deepcopy(repository), pickle.loads(pickle.dumps(repository))]:
+        assert duplicate == repository
+        assert duplicate.depends_on == ("packages",)
@@ -0,0 +1,80 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from cascabel.installation import scheduler
+from cascabel.installation.scheduler import DependencyError, find_dependency_cycle, install_repositories, \
+    run_in_dependency_order
+from cascabel.repository import Repository
+from cascabel.repository_types import RepositoryTypes
+
+
+def make_repository(url: str, depends_on: list[str] = None, order_place: int = -1) -> Repository:
+    return Repository(url=url, type=RepositoryTypes.NONE, installation_directory=f"/tmp/{url}", branch=None,
+                      current_hash=None, execution_directory=None, order_place=order_place,
+                      depends_on=tuple(depends_on or ()))
+
+
+def test_dependencies_finish_before_dependents():
+    finished = []
+    lock = threading.Lock()
+
+    def action(repository: Repository) -> bool:
+        if repository.url == "slow":
+            time.sleep(0.05)
+        with lock:
+            finished.append(repository.url)
+        return True
+
+    repositories = [make_repository("slow"), make_repository("dotfiles", ["packages"]), make_repository("packages")]
+    assert run_in_dependency_order(repositories, action, jobs=4) == []
+    assert finished.index("packages") < finished.index("dotfiles")
+    # Independent repositories do not wait behind an unrelated slow one.
+    assert finished[-1] == "slow"
+
+
+def test_serial_order_follows_order_place():
+    finished = []
+
+    def action(repository: Repository) -> bool:
+        finished.append(repository.url)
+        return True
+
+    repositories = [make_repository("b", order_place=2), make_repository("a", order_place=1),
+                    make_repository("c", ["b"], order_place=0)]
+    run_in_dependency_order(repositories, action, jobs=1)
+    assert finished == ["a", "b", "c"]
+
+
+def test_failed_dependency_skips_dependents():
+    started = []
+
+    def action(repository: Repository) -> bool:
+        started.append(repository.url)
+        return repository.url != "base"
+
+    repositories = [make_repository("base"), make_repository("middle", ["base"]), make_repository("top", ["middle"]),
+                    make_repository("other")]
+    assert run_in_dependency_order(repositories, action, jobs=2) == ["base", "middle", "top"]
+    assert sorted(started) == ["base", "other"]
+
+
+def test_dependency_cycles_are_detected():
+    assert find_dependency_cycle({"a": {"b"}, "b": {"a"}, "c": set(), "d": {"a"}}) == ["a", "b", "d"]
+
+    repositories = [make_repository("a", ["b"]), make_repository("b", ["a"])]
+    with pytest.raises(DependencyError):
+        run_in_dependency_order(repositories, lambda r: True)
+
+
+def test_unexpected_errors_only_fail_their_repository(monkeypatch):
+    def initialize_installer(repository: Repository, *args):
+        if repository.url == "broken":
+            raise TypeError("unexpected")
+        return mock.Mock()
+
+    monkeypatch.setattr(scheduler, "initialize_installer", initialize_installer)
+    repositories = [make_repository("broken"), make_repository("dependent", ["broken"]), make_repository("other")]
+    assert install_repositories(repositories, mock.Mock(), jobs=2) == ["broken", "dependent"]
@@ -0,0 +1,53 @@
+import os
+from pathlib import Path
+
+from cascabel.installation.stow_engine import StowEngine
+
+
+def make_files(directory_path: Path, *paths: str) -> None:
+    for path in paths:
+        directory_path.joinpath(path).parent.mkdir(parents=True, exist_ok=True)
+        directory_path.joinpath(path).touch()
+
+
+def list_links(directory_path: Path) -> dict[str, str]:
+    return {str(path.relative_to(directory_path)): os.readlink(path) for path in directory_path.rglob("*") if
+            path.is_symlink()}
+
+
+def test_stow_folds_and_unfolds_shared_directories(tmp_path: Path):
+    stow_path = tmp_path.joinpath("packages")
+    make_files(stow_path, "vim/.config/vim/vimrc", "vim/.vimrc", "git/.config/git/config", "git/README.md",
+               "vim/.git/HEAD")
+
+    engine = StowEngine(stow_path)
+    assert engine.stow(["vim"]) == {}
+    engine.apply()
+    assert list_links(tmp_path) == {".config": "packages/vim/.config", ".vimrc": "packages/vim/.vimrc"}
+
+    # Stowing a second package into the same directory unfolds it, and ignored files are never linked.
+    assert engine.stow(["git"]) == {}
+    engine.apply()
+    assert list_links(tmp_path) == {".config/git": "../packages/git/.config/git",
+                                    ".config/vim": "../packages/vim/.config/vim", ".vimrc": "packages/vim/.vimrc"}
+
+    # Restowing unchanged packages needs no operations, and unstowing folds the directory again.
+    assert engine.stow(["vim", "git"], restow=True) == {}
+    assert engine.get_operations() == []
+    assert engine.unstow(["git"]) == {}
+    engine.apply()
+    assert list_links(tmp_path) == {".config": "packages/vim/.config", ".vimrc": "packages/vim/.vimrc"}
+
+
+def test_conflicting_package_is_left_out(tmp_path: Path):
+    stow_path = tmp_path.joinpath("packages")
+    make_files(stow_path, "bash/.bashrc", "zsh/.zshrc", "zsh/.stow-local-ignore")
+    stow_path.joinpath("zsh", ".stow-local-ignore").write_text("# Only ignore the list itself.\n\\.stow-local-ignore\n")
+    tmp_path.joinpath(".bashrc").write_text("existing")
+
+    engine = StowEngine(stow_path)
+    conflicts = engine.stow(["bash", "zsh"])
+    engine.apply()
+
+    assert list(conflicts) == ["bash"]
+    assert list_links(tmp_path) == {".zshrc": "packages/zsh/.zshrc"}
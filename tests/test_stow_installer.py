@@ -0,0 +1,77 @@
+import subprocess
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from cascabel.configuration.install_ledger import InstallLedger
+from cascabel.installation import stow_installer
+from cascabel.installation.installer import InstallerError
+from cascabel.installation.stow_installer import StowInstaller
+from cascabel.repository import Repository
+from cascabel.repository_types import RepositoryTypes
+
+
+def make_installer(installation_directory: Path, **kwargs) -> StowInstaller:
+    repository = Repository(url="dotfiles", type=RepositoryTypes.STOW,
+                            installation_directory=str(installation_directory), branch=None, current_hash=None,
+                            execution_directory=None)
+    return StowInstaller(repository, None, **kwargs)
+
+
+def test_remove_links_to_deleted_files(tmp_path: Path):
+    packages_path = tmp_path.joinpath("packages")
+    packages_path.joinpath("vim", ".vim").mkdir(parents=True)
+    packages_path.joinpath("vim", ".vim", "vimrc").touch()
+    tmp_path.joinpath(".vim").symlink_to("packages/vim/.vim")
+    tmp_path.joinpath(".bashrc").symlink_to("packages/bash/.bashrc")
+    installer = make_installer(packages_path)
+
+    # A file deleted from within a folded directory leaves the directory link in place.
+    installer.remove_links("vim/.vim/colors.vim")
+    assert tmp_path.joinpath(".vim").is_symlink()
+
+    # A link to a deleted file is removed.
+    installer.remove_links("bash/.bashrc")
+    assert not tmp_path.joinpath(".bashrc").is_symlink()
+
+
+def test_parse_stow_errors_attributes_conflicts_to_packages():
+    output = ("WARNING! stowing bash would cause conflicts:\n"
+              "  * existing target is neither a link nor a directory: .bashrc\n"
+              "WARNING! stowing zsh would cause conflicts:\n"
+              "  * existing target is not owned by stow: .zshrc\n"
+              "All operations aborted.\n")
+
+    assert StowInstaller.parse_stow_errors(output, ["bash", "vim", "zsh"]) == {
+        "bash": ["existing target is neither a link nor a directory: .bashrc"],
+        "zsh": ["existing target is not owned by stow: .zshrc"]}
+
+    # Errors which cannot be attributed fail every package.
+    assert list(StowInstaller.parse_stow_errors("stow: ERROR: unknown\n", ["bash", "vim"])) == ["bash", "vim"]
+
+
+def test_installation_is_not_skipped_for_another_target_directory(tmp_path: Path):
+    packages_path = tmp_path.joinpath("packages")
+    packages_path.joinpath("bash").mkdir(parents=True)
+    ledger = InstallLedger(tmp_path)
+    installer = make_installer(packages_path, ledger=ledger)
+    installer.record_installation()
+    assert installer.is_installed()
+
+    installer.repository = replace(installer.repository, target_directory=str(tmp_path.joinpath("home")))
+    installer.target_directory = stow_installer.get_target_directory(installer.repository)
+    assert not installer.is_installed()
+
+
+def test_unattributed_stow_errors_do_not_retry_forever(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    calls = []
+
+    def run(arguments, **_):
+        calls.append(arguments)
+        return subprocess.CompletedProcess(arguments, 1, "", "WARNING! stowing other would cause conflicts:\n")
+
+    monkeypatch.setattr(stow_installer.subprocess, "run", run)
+    with pytest.raises(InstallerError):
+        make_installer(tmp_path).stow_directories_with_gnu_stow(["bash", "vim"])
+    assert len(calls) == 1